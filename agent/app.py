@@ -6,38 +6,56 @@ WEB应用容器发布Agent
 支持GUI界面和命令行两种使用方式
 """
 
-from math import log
 import os
 import sys
 import json
+import atexit
+import time
+import bisect
+import hashlib
 import shutil
-import zipfile
+import string
+import functools
+import importlib.util
 import tempfile
 import subprocess
 import threading
-import socket
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 import click
 
-# 尝试导入GUI库
+# 检查GUI库是否可用（实际导入推迟到启动GUI时，命令行模式无需加载tkinter）
+# 同时检查 _tkinter 扩展：未编译Tk支持的Python（如pyenv/Docker官方镜像）只有纯Python的tkinter包
+GUI_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('tkinter', '_tkinter'))
+if not GUI_AVAILABLE:
+    print("警告: 无法导入tkinter，GUI模式不可用")
+
+# 检查webview库是否可用（用于JS底座，同样在使用时才导入）
+WEBVIEW_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('webview', 'requests'))
+if not WEBVIEW_AVAILABLE:
+    print("警告: 无法导入webview或requests，JS底座功能不可用")
+    print("请运行: pip install pywebview requests")
+
+# 尝试导入orjson加速JSON序列化（可选依赖）
 try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def import_gui_modules():
+    """导入tkinter相关模块"""
+    global tk, ttk, filedialog, messagebox, scrolledtext
     import tkinter as tk
     from tkinter import ttk, filedialog, messagebox, scrolledtext
-    GUI_AVAILABLE = True
-except ImportError:
-    GUI_AVAILABLE = False
-    print("警告: 无法导入tkinter，GUI模式不可用")
 
-# 尝试导入webview库用于JS底座
-try:
+def import_webview_modules():
+    """导入JS底座所需的webview模块"""
+    global webview, requests
     import webview
     import requests
-    WEBVIEW_AVAILABLE = True
-except ImportError:
-    WEBVIEW_AVAILABLE = False
-    print("警告: 无法导入webview或requests，JS底座功能不可用")
-    print("请运行: pip install pywebview requests")
 
 # 配置
 CONFIG = {
@@ -48,6 +66,12 @@ CONFIG = {
     'BASE_IMAGE_NAME': 'hzxy-webapp-base',
     'BUILD_FOLDER': 'builds',
     'CONFIG_FILE': os.path.expanduser('~/.hzxy-agent-config.json'),
+    # DockerHub登录状态缓存
+    'LOGIN_CACHE_FILE': os.path.expanduser('~/.cache/hzxy/token.json'),
+    'LOGIN_CACHE_TTL': 12 * 3600,
+    'DOCKER_CONFIG_DIR': os.path.expanduser('~/.cache/hzxy/docker'),
+    # dist.zip内容哈希 -> 已构建镜像标签
+    'DIST_CACHE_FILE': os.path.expanduser('~/.hzxy-agent-builds.json'),
     # JS底座配置
     'REMOTE_URL': '',
     'REMOTE_USERNAME': 'Happy',
@@ -64,15 +88,38 @@ CONFIG = {
 # 确保构建目录存在
 os.makedirs(CONFIG['BUILD_FOLDER'], exist_ok=True)
 
+def dump_json(data, compact=False):
+    """将数据序列化为UTF-8编码的JSON字节（优先使用orjson）"""
+    if orjson is not None:
+        return orjson.dumps(data) if compact else orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+def load_json(data):
+    """解析UTF-8编码的JSON字节（优先使用orjson）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def write_file_atomic(path, data):
+    """先写入临时文件再重命名，避免写入中断导致文件损坏"""
+    tmp_path = f"{path}.tmp"
+    # 不调用fsync：崩溃时最多丢失最近一次写入，但不会留下损坏的文件
+    with open(tmp_path, 'wb', buffering=1 << 20) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
 def load_config():
     """加载配置文件"""
-    if os.path.exists(CONFIG['CONFIG_FILE']):
-        try:
-            with open(CONFIG['CONFIG_FILE'], 'r', encoding='utf-8') as f:
-                saved_config = json.load(f)
-                CONFIG.update(saved_config)
-        except Exception as e:
-            print(f"加载配置文件失败: {e}")
+    try:
+        with open(CONFIG['CONFIG_FILE'], 'rb') as f:
+            saved_config = load_json(f.read())
+        CONFIG.update(saved_config)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"加载配置文件失败: {e}")
 
 def save_config():
     """保存配置文件"""
@@ -93,135 +140,737 @@ def save_config():
             'REQUEST_PARAMS': CONFIG['REQUEST_PARAMS'],
             'TOKEN_PATH': CONFIG['TOKEN_PATH']
         }
-        with open(CONFIG['CONFIG_FILE'], 'w', encoding='utf-8') as f:
-            json.dump(config_to_save, f, indent=2, ensure_ascii=False)
+        write_file_atomic(CONFIG['CONFIG_FILE'], dump_json(config_to_save))
     except Exception as e:
         print(f"保存配置文件失败: {e}")
 
+def _login_fingerprint(username, token):
+    """计算登录凭据指纹，避免在缓存文件中保存明文token"""
+    return hashlib.sha256(f"{username}:{token}".encode('utf-8')).hexdigest()
+
+def is_login_cached(username, token, docker_config_dir):
+    """检查DockerHub登录状态缓存是否仍然有效"""
+    try:
+        with open(CONFIG['LOGIN_CACHE_FILE'], 'rb') as f:
+            cached = load_json(f.read())
+        with open(Path(docker_config_dir) / 'config.json', 'rb') as f:
+            docker_config = load_json(f.read())
+    except (OSError, ValueError):
+        return False
+    if not isinstance(cached, dict) or not isinstance(docker_config, dict):
+        return False
+    
+    return (
+        cached.get('fingerprint') == _login_fingerprint(username, token)
+        and cached.get('docker_config') == str(docker_config_dir)
+        and cached.get('expires_at', 0) > time.time()
+        and bool(docker_config.get('auths'))
+    )
+
+def save_login_cache(username, token, docker_config_dir):
+    """保存DockerHub登录状态缓存"""
+    try:
+        cache_file = CONFIG['LOGIN_CACHE_FILE']
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        data = dump_json({
+            'fingerprint': _login_fingerprint(username, token),
+            'docker_config': str(docker_config_dir),
+            'expires_at': int(time.time()) + CONFIG['LOGIN_CACHE_TTL']
+        }, compact=True)
+        fd = os.open(cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+    except Exception as e:
+        print(f"保存登录缓存失败: {e}")
+
+def clear_login_cache():
+    """删除DockerHub登录状态缓存（推送鉴权失败时调用，避免继续信任已失效的token）"""
+    try:
+        os.remove(CONFIG['LOGIN_CACHE_FILE'])
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"删除登录缓存失败: {e}")
+
+# docker push 输出中表示鉴权失败的关键字
+PUSH_AUTH_ERROR_MARKERS = ('unauthorized', 'authentication required', 'denied')
+
+def is_push_auth_error(output):
+    """判断推送失败是否由鉴权引起"""
+    output = output.lower()
+    return any(marker in output for marker in PUSH_AUTH_ERROR_MARKERS)
+
+_docker_config_dir = None
+
+def get_docker_config_dir():
+    """获取禁用凭据存储的Docker配置目录（每个进程只初始化一次）"""
+    global _docker_config_dir
+    if _docker_config_dir is None:
+        config_dir = Path(CONFIG['DOCKER_CONFIG_DIR'])
+        config_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        config_file = config_dir / 'config.json'
+        # 已存在时保留其中的登录信息，供登录缓存复用
+        if not config_file.exists():
+            config_file.write_text('{"credsStore": ""}')
+        _docker_config_dir = config_dir
+    return _docker_config_dir
+
+@functools.lru_cache(maxsize=1)
 def find_docker_command():
-    """查找Docker命令的完整路径"""
-    # 常见的Docker安装路径
+    """查找Docker命令的完整路径（结果会被缓存）"""
+    # 优先在PATH中查找，无需启动子进程
+    docker_path = shutil.which('docker')
+    if docker_path:
+        return docker_path
+    
+    # 常见的Docker安装路径（检查可执行权限即可，无需运行 --version）
     docker_paths = [
         '/usr/local/bin/docker',
         '/usr/bin/docker',
-        '/Applications/Docker.app/Contents/Resources/bin/docker',
-        'docker'  # 如果在PATH中
+        '/Applications/Docker.app/Contents/Resources/bin/docker'
     ]
     
     for path in docker_paths:
-        try:
-            result = subprocess.run([path, '--version'], capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                return path
-        except (subprocess.TimeoutExpired, FileNotFoundError, subprocess.SubprocessError):
-            continue
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
     
     return None
 
-def get_available_port(start_port=3000):
-    """获取可用端口"""
-    for port in range(start_port, start_port + 100):
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.bind(('localhost', port))
-                return port
-        except OSError:
-            continue
-    return None
+def get_docker_cli_endpoint(docker_cmd):
+    """查询docker CLI实际连接的守护进程地址（DOCKER_HOST优先，其次为当前docker context），查询失败返回None"""
+    if os.environ.get('DOCKER_HOST'):
+        return os.environ['DOCKER_HOST']
+    try:
+        result = subprocess.run(
+            [docker_cmd, 'context', 'inspect', '--format', '{{.Endpoints.docker.Host}}'],
+            capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
 
-def get_container_status(container_name):
-    """获取容器状态"""
+@functools.lru_cache(maxsize=1)
+def get_docker_client():
+    """获取Docker SDK客户端（可选依赖，复用与守护进程的连接；不可用时返回None，回退到docker CLI）
+    
+    构建仍通过docker CLI完成，因此只有SDK能连接到与CLI相同的守护进程时才使用SDK，
+    否则（rootless、colima、远程context等）测试容器可能找不到CLI刚构建的镜像。
+    """
+    try:
+        import docker
+    except ImportError:
+        return None
+    
     docker_cmd = find_docker_command()
     if not docker_cmd:
         return None
+    endpoint = get_docker_cli_endpoint(docker_cmd)
+    if not endpoint:
+        return None
     
     try:
-        # 检查容器是否存在并获取状态
+        if os.environ.get('DOCKER_HOST'):
+            # CLI和SDK都按 DOCKER_HOST/DOCKER_TLS_VERIFY/DOCKER_CERT_PATH 连接
+            client = docker.from_env()
+        elif endpoint.startswith(('unix://', 'npipe://')):
+            # 本地socket类型的context，直接连接同一个socket
+            client = docker.DockerClient(base_url=endpoint)
+        else:
+            # TLS/SSH等远程context的连接参数只有CLI能完整解析，交给CLI处理
+            return None
+        client.ping()
+        return client
+    except Exception:
+        return None
+
+def refresh_docker_command():
+    """清除Docker命令路径缓存并重新查找"""
+    find_docker_command.cache_clear()
+    get_docker_client.cache_clear()
+    buildx_available.cache_clear()
+    return find_docker_command()
+
+def get_container_host_port(docker_cmd, container_name, container_port=80):
+    """查询容器端口映射到宿主机的端口号，查询失败时返回None"""
+    result = subprocess.run(
+        [docker_cmd, 'port', container_name, str(container_port)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None
+    # 输出形如 "0.0.0.0:49153"，IPv4/IPv6各一行，端口相同
+    for line in result.stdout.splitlines():
+        host_port = line.rpartition(':')[2].strip()
+        if host_port.isdigit():
+            return int(host_port)
+    return None
+
+def _format_sdk_ports(ports):
+    """将SDK返回的端口映射格式化为与 docker ps 相同的形式"""
+    formatted = []
+    for p in ports or []:
+        if p.get('PublicPort'):
+            formatted.append(f"{p.get('IP', '')}:{p['PublicPort']}->{p['PrivatePort']}/{p['Type']}")
+        else:
+            formatted.append(f"{p['PrivatePort']}/{p['Type']}")
+    return ', '.join(formatted)
+
+def get_all_container_statuses():
+    """一次性获取所有容器状态，返回 {容器名: 状态信息}"""
+    client = get_docker_client()
+    if client is not None:
+        try:
+            statuses = {}
+            for container in client.api.containers(all=True):
+                status = container.get('Status', '')
+                info = {
+                    'running': 'Up' in status,
+                    'status': status,
+                    'ports': _format_sdk_ports(container.get('Ports'))
+                }
+                for name in container.get('Names') or []:
+                    statuses[name.lstrip('/')] = info
+            return statuses
+        except Exception:
+            pass
+    
+    docker_cmd = find_docker_command()
+    if not docker_cmd:
+        return {}
+    
+    statuses = {}
+    try:
         result = subprocess.run([
-            docker_cmd, 'ps', '-a', '--filter', f'name={container_name}', 
-            '--format', 'table {{.Names}}\t{{.Status}}\t{{.Ports}}'
+            docker_cmd, 'ps', '-a',
+            '--format', '{{.Names}}\t{{.Status}}\t{{.Ports}}'
         ], capture_output=True, text=True)
         
-        if result.returncode == 0 and result.stdout.strip():
-            lines = result.stdout.strip().split('\n')
-            if len(lines) > 1:  # 跳过表头
-                parts = lines[1].split('\t')
+        if result.returncode == 0:
+            for line in result.stdout.splitlines():
+                parts = line.split('\t')
                 if len(parts) >= 2:
                     status = parts[1]
-                    ports = parts[2] if len(parts) > 2 else ''
-                    return {
+                    statuses[parts[0]] = {
                         'running': 'Up' in status,
                         'status': status,
-                        'ports': ports
+                        'ports': parts[2] if len(parts) > 2 else ''
                     }
     except Exception:
         pass
     
-    return None
+    return statuses
+
+def start_test_container(image, container_name, container_port=80):
+    """启动测试容器（先强制删除同名容器，宿主机端口由Docker分配），返回 (宿主机端口, 错误信息)"""
+    client = get_docker_client()
+    if client is not None:
+        try:
+            client.api.remove_container(container_name, force=True)
+        except Exception:
+            pass  # 容器不存在
+        try:
+            container = client.containers.run(
+                image, name=container_name, detach=True,
+                ports={f'{container_port}/tcp': None}
+            )
+            container.reload()
+            for binding in container.ports.get(f'{container_port}/tcp') or []:
+                if binding.get('HostPort', '').isdigit():
+                    return int(binding['HostPort']), None
+            return None, f"无法获取测试容器端口: {container_name}"
+        except Exception as e:
+            return None, str(e)
+    
+    docker_cmd = find_docker_command()
+    if not docker_cmd:
+        return None, "未找到Docker命令"
+    
+    # 强制删除现有容器（一次调用完成停止和删除）
+    subprocess.run([docker_cmd, 'rm', '-f', container_name],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    # 只在失败时需要stderr，容器ID输出直接丢弃
+    result = subprocess.run(
+        [docker_cmd, 'run', '-d', '--name', container_name, '-p', f'0:{container_port}', image],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    if result.returncode != 0:
+        return None, result.stderr
+    
+    port = get_container_host_port(docker_cmd, container_name, container_port)
+    if not port:
+        return None, f"无法获取测试容器端口: {container_name}"
+    return port, None
 
-def run_command(cmd, cwd=None, callback=None, env=None):
-    """执行命令并返回结果"""
+def stop_container(container_name):
+    """停止容器，成功返回None，失败返回错误信息"""
+    client = get_docker_client()
+    if client is not None:
+        try:
+            client.api.stop(container_name)
+            return None
+        except Exception as e:
+            return str(e)
+    
+    docker_cmd = find_docker_command()
+    if not docker_cmd:
+        return "未找到Docker命令"
+    
+    result = subprocess.run([docker_cmd, 'stop', container_name],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return None if result.returncode == 0 else result.stderr
+
+OUTPUT_READ_SIZE = 64 * 1024
+
+def run_command(cmd, cwd=None, callback=None, env=None, input=None):
+    """执行命令并返回结果（cmd为参数列表，不经过shell）"""
     try:
         if callback:
             # 实时输出模式
             process = subprocess.Popen(
-                cmd, shell=True, cwd=cwd, env=env,
+                cmd, cwd=cwd, env=env,
                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                universal_newlines=True, bufsize=1
+                bufsize=OUTPUT_READ_SIZE
             )
             
+            # 按块读取原始字节，再自行切分行，避免逐行readline的开销
             output_lines = []
-            for line in iter(process.stdout.readline, ''):
-                line = line.rstrip()
+            fd = process.stdout.fileno()
+            pending = bytearray()
+            
+            def emit(raw):
+                line = raw.decode('utf-8', errors='replace').rstrip()
                 output_lines.append(line)
                 callback(line)
             
+            while True:
+                data = os.read(fd, OUTPUT_READ_SIZE)
+                if not data:
+                    break
+                pending += data
+                *lines, rest = pending.split(b'\n')
+                for raw in lines:
+                    emit(raw)
+                pending = bytearray(rest)
+            if pending:
+                emit(pending)
+            
+            process.stdout.close()
             process.wait()
             return process.returncode == 0, '\n'.join(output_lines), ''
         else:
             # 普通模式
-            result = subprocess.run(cmd, shell=True, cwd=cwd, env=env, capture_output=True, text=True)
+            result = subprocess.run(cmd, cwd=cwd, env=env, input=input, capture_output=True, text=True)
             return result.returncode == 0, result.stdout, result.stderr
     except Exception as e:
         return False, '', str(e)
 
-def create_dockerfile(app_name, version, maintainer="HZXY DevOps Team"):
-    """创建Dockerfile"""
-    dockerfile_content = f'''
+DIST_COPY_CHUNK_SIZE = 8 * 1024 * 1024
+DIST_CACHE_MAX_ENTRIES = 200  # 构建复用缓存最多保留的条目数，超出时淘汰最久未使用的
+
+def stage_dist(src, dst):
+    """将dist文件放入构建上下文（优先硬链接，跨文件系统时再复制）"""
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        try:
+            while remaining > 0:
+                sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, remaining)
+                if sent == 0:
+                    break
+                offset += sent
+                remaining -= sent
+        except (AttributeError, OSError):
+            # 平台不支持sendfile时回退到普通复制
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            shutil.copyfileobj(fsrc, fdst, DIST_COPY_CHUNK_SIZE)
+
+# Dockerfile模板（构建日期通过 docker build --label 注入，避免破坏层缓存）
+# 使用多阶段构建：解压在独立阶段完成，最终镜像不包含dist.zip；标签放在最后，不影响文件层缓存
+DOCKERFILE_TMPL = '''
+# 解压阶段
+FROM nginx:alpine AS extractor
+COPY dist.zip /tmp/dist.zip
+RUN mkdir -p /tmp/app && unzip -q /tmp/dist.zip -d /tmp/app && \\
+    if [ -d /tmp/app/dist ]; then mv /tmp/app/dist /site; else mv /tmp/app /site; fi
+
 FROM nginx:alpine
 
 # 设置工作目录
 WORKDIR /usr/share/nginx/html
 
-# 删除默认的nginx页面
+# 删除默认的nginx页面（不依赖应用文件，始终命中缓存）
 RUN rm -rf /usr/share/nginx/html/*
 
-# 复制应用文件
-COPY dist.zip /tmp/dist.zip
+# 复制解压后的应用文件
+COPY --from=extractor /site/ /usr/share/nginx/html/
 
-# 解压应用文件并保持目录结构
-RUN cd /tmp && unzip dist.zip && \
-    if [ -d "dist" ]; then \
-        cp -r dist/* /usr/share/nginx/html/; \
-    else \
-        cp -r . /usr/share/nginx/html/ && \
-        rm -f /usr/share/nginx/html/dist.zip; \
-    fi && \
-    rm -rf /tmp/dist.zip /tmp/dist
+# 暴露端口
+EXPOSE 80
+
+# 启动nginx
+CMD ["nginx", "-g", "daemon off;"]
 
 # 添加标签
 LABEL app.name="{app_name}"
 LABEL app.version="{version}"
-LABEL app.build.date="{datetime.now().isoformat()}"
 LABEL maintainer="{maintainer}"
+'''
 
-# 暴露端口
-EXPOSE 80
+# docker-compose模板（模块加载时解析一次，GUI和CLI共用）
+COMPOSE_TMPL = string.Template('''services:
+  ${prefix}-${app}:
+    image: ${user}/${base}-${app}:${ver}
+    container_name: ${prefix}-${app}
+    ports:
+      - "${port}:80"
+    restart: unless-stopped
+    networks:
+      - ${prefix}-network
 
-# 启动nginx
-CMD ["nginx", "-g", "daemon off;"]
-'''
-    return dockerfile_content
+networks:
+  ${prefix}-network:
+    driver: bridge
+''')
+
+# 登录回调方法（JavaScript）模板
+CALLBACK_CODE_TMPL = string.Template('''// 自动生成的登录回调方法
+// 接口地址: ${login_url}
+// 请求方法: ${request_method}
+// Content-Type: ${content_type}
+// Token路径: ${token_path}
+function getAuthToken(username, password) {
+    console.log('=== 开始登录请求 ===');
+    console.log('用户名:', username);
+    console.log('密码长度:', password ? password.length : 0);
+    
+    try {
+        // 构建完整的登录URL
+        const loginUrl = ${url_code};
+        console.log('登录URL:', loginUrl);
+        
+        // 构建请求体
+        const requestBody = ${body_code};
+        console.log('请求体:', requestBody);
+        
+        // 发送登录请求
+        console.log('发送 ${request_method} 请求...');
+        const xhr = new XMLHttpRequest();
+        xhr.open('${request_method}', loginUrl, false); // 同步请求
+        xhr.setRequestHeader('Content-Type', '${content_type_header}');
+        
+        xhr.send(requestBody);
+        
+        console.log('响应状态码:', xhr.status);
+        console.log('响应文本:', xhr.responseText);
+        
+        if (xhr.status === 200) {
+            const response = JSON.parse(xhr.responseText);
+            console.log('解析后的响应:', response);
+            
+            // 根据配置的路径提取token
+            const token = ${token_access_code};
+            console.log('提取的token:', token);
+            
+            if (token) {
+                console.log('=== 登录成功 ===');
+                return {
+                    token: token,
+                    success: true
+                };
+            } else {
+                console.error('未找到token，路径:', '${token_path}');
+                console.error('响应结构:', JSON.stringify(response, null, 2));
+                return {
+                    token: null,
+                    success: false,
+                    error: '未找到token'
+                };
+            }
+        } else {
+            console.error('登录失败，状态码:', xhr.status);
+            console.error('响应内容:', xhr.responseText);
+            return {
+                token: null,
+                success: false,
+                error: '登录失败: ' + xhr.status
+            };
+        }
+    } catch (error) {
+        console.error('登录请求异常:', error);
+        console.error('错误堆栈:', error.stack);
+        return {
+            token: null,
+            success: false,
+            error: '请求异常: ' + error.message
+        };
+    }
+}''')
+
+# JS底座页面模板（JS中的 $ 已转义为 $$）
+JS_BASE_HTML_TMPL = string.Template('''
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>JS底座 - 远程站点免登录</title>
+    <style>
+        body {
+            margin: 0;
+            padding: 0;
+            font-family: Arial, sans-serif;
+        }
+        .header {
+            background: #2c3e50;
+            color: white;
+            padding: 10px 20px;
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+        }
+        .status {
+            padding: 5px 10px;
+            border-radius: 3px;
+            font-size: 12px;
+        }
+        .status.loading {
+            background: #f39c12;
+        }
+        .status.success {
+            background: #27ae60;
+        }
+        .status.error {
+            background: #e74c3c;
+        }
+        #remote-frame {
+            width: 100%;
+            height: calc(100vh - 60px);
+            border: none;
+        }
+        .loading {
+            text-align: center;
+            padding: 50px;
+            font-size: 18px;
+            color: #7f8c8d;
+        }
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h3>🌐 JS底座 - ${remote_url}</h3>
+        <div style="display: flex; align-items: center; gap: 10px;">
+            <button id="login-btn" onclick="manualLogin()" style="
+                background: #3498db;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+                cursor: pointer;
+                font-size: 12px;
+            ">🔑 手动登录</button>
+            <div id="status" class="status loading">等待手动登录...</div>
+        </div>
+    </div>
+    
+    <div id="loading" class="loading">
+        <p>正在获取访问令牌并加载远程站点...</p>
+        <p>目标地址: ${remote_url}</p>
+    </div>
+    
+    <iframe id="remote-frame" style="display: none;"></iframe>
+    
+    <script>
+        // 用户提供的回调方法
+        ${callback_method}
+        
+        // 主要逻辑
+        async function initializeJSBase() {
+            const statusEl = document.getElementById('status');
+            const loadingEl = document.getElementById('loading');
+            const frameEl = document.getElementById('remote-frame');
+            
+            try {
+                // 检查是否有有效的回调方法
+                if (typeof getAuthToken === 'function') {
+                    statusEl.textContent = '正在获取访问令牌...';
+                    statusEl.className = 'status loading';
+                    
+                    // 调用用户定义的回调方法获取token
+                    const authResult = await getAuthToken('${username}', '${password}');
+                    
+                    if (!authResult || !authResult.success) {
+                        throw new Error('获取访问令牌失败: ' + (authResult?.message || '未知错误'));
+                    }
+                    
+                    const token = authResult.token;
+                    console.log('获取到访问令牌:', token);
+                    
+                    statusEl.textContent = '正在加载远程站点...';
+                    
+                    // 构建带token的URL
+                    const targetUrl = buildAuthenticatedUrl('${remote_url}', token);
+                    frameEl.src = targetUrl;
+                } else {
+                    // 没有回调方法，直接加载目标网站（测试模式）
+                    console.log('未找到getAuthToken方法，直接加载目标网站');
+                    statusEl.textContent = '直接加载模式...';
+                    statusEl.className = 'status loading';
+                    frameEl.src = '${remote_url}';
+                }
+                
+                frameEl.onload = function() {
+                    statusEl.textContent = '加载完成';
+                    statusEl.className = 'status success';
+                    loadingEl.style.display = 'none';
+                    frameEl.style.display = 'block';
+                    
+                    // 重新启用登录按钮
+                    const loginBtn = document.getElementById('login-btn');
+                    loginBtn.disabled = false;
+                    loginBtn.textContent = '🔄 重新登录';
+                };
+                
+                frameEl.onerror = function() {
+                    throw new Error('远程站点加载失败');
+                };
+                
+            } catch (error) {
+                console.error('JS底座初始化失败:', error);
+                statusEl.textContent = '加载失败: ' + error.message;
+                statusEl.className = 'status error';
+                loadingEl.innerHTML = `
+                    <p style="color: #e74c3c;">❌ 加载失败</p>
+                    <p>错误信息: $${error.message}</p>
+                    <p>请检查回调方法实现和网络连接</p>
+                    <p>如果没有实现getAuthToken方法，将尝试直接加载目标网站</p>
+                `;
+                
+                // 重新启用登录按钮
+                const loginBtn = document.getElementById('login-btn');
+                loginBtn.disabled = false;
+                loginBtn.textContent = '🔑 重试登录';
+            }
+        }
+        
+        // 构建带认证信息的URL
+        function buildAuthenticatedUrl(baseUrl, token) {
+            const url = new URL(baseUrl);
+            // 可以根据需要调整token的传递方式
+            // 方式1: 作为查询参数
+            url.searchParams.set('token', token);
+            // 方式2: 作为hash参数
+            // url.hash = 'token=' + token;
+            return url.toString();
+        }
+        
+        // 手动登录函数
+         function manualLogin() {
+             console.log('=== 手动触发登录流程 ===');
+             console.log('提示：请查看控制台获取详细日志');
+             
+             const loginBtn = document.getElementById('login-btn');
+             loginBtn.disabled = true;
+             loginBtn.textContent = '登录中...';
+             
+             initializeJSBase();
+         }
+         
+         // 页面加载完成后准备就绪
+         document.addEventListener('DOMContentLoaded', function() {
+             console.log('=== JS底座页面已加载 ===');
+             console.log('提示：请点击顶部的"手动登录"按钮开始登录流程');
+             console.log('或者打开开发者工具控制台查看详细日志');
+         });
+    </script>
+</body>
+</html>
+        ''')
+
+def hash_dist_file(path):
+    """流式计算dist文件的sha256"""
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(DIST_COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+def dockerfile_inputs_hash(maintainer):
+    """计算Dockerfile模板与维护者信息的指纹，模板或配置变化后不再复用旧镜像"""
+    return hashlib.sha256(f"{maintainer}\0{DOCKERFILE_TMPL}".encode('utf-8')).hexdigest()[:16]
+
+def load_dist_cache():
+    """加载构建指纹到镜像标签的映射（按最近使用顺序排列）"""
+    try:
+        with open(CONFIG['DIST_CACHE_FILE'], 'rb') as f:
+            cache = load_json(f.read())
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+def save_dist_cache(cache):
+    """保存构建指纹到镜像标签的映射，只保留最近使用的条目"""
+    try:
+        for key in list(cache)[:-DIST_CACHE_MAX_ENTRIES]:
+            del cache[key]
+        write_file_atomic(CONFIG['DIST_CACHE_FILE'], dump_json(cache))
+    except Exception as e:
+        print(f"保存构建缓存失败: {e}")
+
+def create_dockerfile(app_name, version, maintainer="HZXY DevOps Team"):
+    """创建Dockerfile"""
+    return DOCKERFILE_TMPL.format(app_name=app_name, version=version, maintainer=maintainer)
+
+def build_date_label():
+    """生成构建日期标签参数"""
+    return ['--label', f"app.build.date={datetime.now().isoformat()}"]
+
+def buildkit_cache_args(cache_from=None):
+    """生成BuildKit缓存参数：写入内联缓存元数据，并可复用远程镜像的层"""
+    args = ['--build-arg', 'BUILDKIT_INLINE_CACHE=1']
+    if cache_from:
+        args += ['--cache-from', cache_from]
+    return args
+
+@functools.lru_cache(maxsize=None)
+def buildx_available(docker_cmd):
+    """检查buildx组件是否可用（结果会被缓存）
+    
+    Docker 23+ 在显式启用BuildKit但缺少buildx时会直接拒绝构建，
+    因此只有buildx可用时才启用BuildKit，否则沿用docker默认的构建器
+    """
+    try:
+        result = subprocess.run(
+            [docker_cmd, 'buildx', 'version'],
+            capture_output=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return result.returncode == 0
+
+def buildkit_env(docker_cmd, env=None):
+    """生成构建使用的环境变量，buildx可用时启用BuildKit"""
+    env = dict(env or os.environ)
+    if buildx_available(docker_cmd):
+        env.update(DOCKER_BUILDKIT='1', BUILDKIT_PROGRESS='plain')
+    return env
+
+def build_cache_args(docker_cmd, cache_from=None):
+    """生成构建缓存参数，未启用BuildKit时不附加"""
+    return buildkit_cache_args(cache_from) if buildx_available(docker_cmd) else []
 
 def build_image(dist_file_path, app_name, build_time, callback=None):
     """仅构建Docker镜像"""
@@ -232,8 +881,9 @@ def build_image(dist_file_path, app_name, build_time, callback=None):
             callback(error_msg)
         return False
     
-    build_dir = Path(CONFIG['BUILD_FOLDER']) / f"{app_name}-{build_time}"
-    build_dir.mkdir(parents=True, exist_ok=True)
+    # 使用唯一命名的临时构建目录，支持并发构建
+    build_ctx = tempfile.TemporaryDirectory(prefix=f"{app_name}-{build_time}-", dir=CONFIG['BUILD_FOLDER'])
+    build_dir = Path(build_ctx.name)
     
     def log(message):
         print(message)
@@ -242,11 +892,35 @@ def build_image(dist_file_path, app_name, build_time, callback=None):
     
     try:
         log(f"开始构建应用: {app_name} - {build_time}")
+        
+        # 构建镜像
+        image_tag = f"{app_name}:{build_time}"
+        
+        # 相同内容的dist已构建过且镜像仍存在时，直接打标签复用
+        dist_hash = hash_dist_file(dist_file_path)
+        cache_key = f"{app_name}@{dist_hash}@{dockerfile_inputs_hash(CONFIG['MAINTAINER'])}"
+        dist_cache = load_dist_cache()
+        cached_tag = dist_cache.pop(cache_key, None)
+        if cached_tag:
+            inspected, _, _ = run_command([docker_cmd, 'image', 'inspect', cached_tag])
+            if inspected:
+                tagged, _, stderr = run_command([docker_cmd, 'tag', cached_tag, image_tag])
+                if tagged:
+                    # 重新放到末尾，标记为最近使用
+                    dist_cache[cache_key] = cached_tag
+                    save_dist_cache(dist_cache)
+                    log(f"dist内容与Dockerfile均未变化，复用已构建镜像: {cached_tag}")
+                    log(f"⚠️ 复用的镜像沿用原构建的标签（app.version、app.build.date 来自 {cached_tag}）")
+                    log("✅ 构建成功!")
+                    log(f"镜像标签: {image_tag}")
+                    return True
+                log(f"复用已构建镜像失败，重新构建: {stderr}")
+        
         log(f"构建目录: {build_dir}")
         
         # 复制dist文件
         log("复制dist文件...")
-        shutil.copy2(dist_file_path, build_dir / 'dist.zip')
+        stage_dist(dist_file_path, build_dir / 'dist.zip')
         
         # 创建Dockerfile
         log("创建Dockerfile...")
@@ -254,13 +928,16 @@ def build_image(dist_file_path, app_name, build_time, callback=None):
         with open(build_dir / 'Dockerfile', 'w', encoding='utf-8') as f:
             f.write(dockerfile_content)
         
-        # 构建镜像
-        image_tag = f"{app_name}:{build_time}"
+        # 已配置DockerHub时复用已发布的latest镜像层
+        cache_from = None
+        if CONFIG['DOCKERHUB_USERNAME']:
+            cache_from = f"{CONFIG['DOCKERHUB_USERNAME']}/{CONFIG['BASE_IMAGE_NAME']}-{app_name}:latest"
         
         log(f"构建镜像: {image_tag}")
         success, stdout, stderr = run_command(
-            f"{docker_cmd} build -t {image_tag} .", 
+            [docker_cmd, 'build', '-t', image_tag, *build_date_label(), *build_cache_args(docker_cmd, cache_from), '.'],
             cwd=build_dir, 
+            env=buildkit_env(docker_cmd),
             callback=log if callback else None
         )
         
@@ -268,6 +945,9 @@ def build_image(dist_file_path, app_name, build_time, callback=None):
             log(f"构建失败: {stderr}")
             return False
         
+        dist_cache[cache_key] = image_tag
+        save_dist_cache(dist_cache)
+        
         log("✅ 构建成功!")
         log(f"镜像标签: {image_tag}")
         
@@ -278,12 +958,11 @@ def build_image(dist_file_path, app_name, build_time, callback=None):
         return False
     finally:
         # 清理构建目录
-        if build_dir.exists():
-            try:
-                shutil.rmtree(build_dir)
-                log(f"清理构建目录: {build_dir}")
-            except Exception as e:
-                log(f"清理构建目录失败: {e}")
+        try:
+            build_ctx.cleanup()
+            log(f"清理构建目录: {build_dir}")
+        except Exception as e:
+            log(f"清理构建目录失败: {e}")
 
 def build_and_push_image(app_name, version, dist_file_path, username=None, token=None, callback=None):
     """构建并推送Docker镜像"""
@@ -304,8 +983,9 @@ def build_and_push_image(app_name, version, dist_file_path, username=None, token
         if callback:
             callback(error_msg)
         return False, error_msg
-    build_dir = Path(CONFIG['BUILD_FOLDER']) / f"{app_name}-{version}-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    build_dir.mkdir(parents=True, exist_ok=True)
+    # 使用唯一命名的临时构建目录，支持并发构建
+    build_ctx = tempfile.TemporaryDirectory(prefix=f"{app_name}-{version}-", dir=CONFIG['BUILD_FOLDER'])
+    build_dir = Path(build_ctx.name)
     
     def log(message):
         print(message)
@@ -318,7 +998,7 @@ def build_and_push_image(app_name, version, dist_file_path, username=None, token
         
         # 复制dist文件
         log("复制dist文件...")
-        shutil.copy2(dist_file_path, build_dir / 'dist.zip')
+        stage_dist(dist_file_path, build_dir / 'dist.zip')
         
         # 创建Dockerfile
         log("创建Dockerfile...")
@@ -332,8 +1012,9 @@ def build_and_push_image(app_name, version, dist_file_path, username=None, token
         
         log(f"构建镜像: {image_tag}")
         success, stdout, stderr = run_command(
-            f"{docker_cmd} build -t {image_tag} -t {latest_tag} .", 
+            [docker_cmd, 'build', '-t', image_tag, '-t', latest_tag, *build_date_label(), *build_cache_args(docker_cmd, latest_tag), '.'],
             cwd=build_dir, 
+            env=buildkit_env(docker_cmd),
             callback=log if callback else None
         )
         
@@ -342,48 +1023,57 @@ def build_and_push_image(app_name, version, dist_file_path, username=None, token
         
         # 登录DockerHub
         if dockerhub_token:
-            log("登录DockerHub...")
-            # 使用临时配置禁用凭据存储
-            login_cmd = f"echo '{dockerhub_token}' | {docker_cmd} login -u {dockerhub_username} --password-stdin"
-            
-            # 设置环境变量禁用凭据存储
-            import os
+            # 使用独立的Docker配置目录禁用凭据存储
+            docker_config_dir = get_docker_config_dir()
             env = os.environ.copy()
-            env['DOCKER_CONFIG'] = '/tmp/.docker'
-            
-            # 创建临时Docker配置目录
-            temp_docker_dir = Path('/tmp/.docker')
-            temp_docker_dir.mkdir(exist_ok=True)
-            
-            # 创建config.json禁用凭据存储
-            config_content = '{"credsStore": ""}'
-            with open(temp_docker_dir / 'config.json', 'w') as f:
-                f.write(config_content)
+            env['DOCKER_CONFIG'] = str(docker_config_dir)
             
-            success, _, stderr = run_command(login_cmd, env=env)
-            if not success:
-                return False, f"DockerHub登录失败: {stderr}"
+            if is_login_cached(dockerhub_username, dockerhub_token, docker_config_dir):
+                log("复用已缓存的DockerHub登录状态")
+            else:
+                log("登录DockerHub...")
+                login_cmd = [docker_cmd, 'login', '-u', dockerhub_username, '--password-stdin']
+                success, _, stderr = run_command(login_cmd, env=env, input=dockerhub_token)
+                if not success:
+                    return False, f"DockerHub登录失败: {stderr}"
+                save_login_cache(dockerhub_username, dockerhub_token, docker_config_dir)
         
         # 推送镜像（使用相同的环境变量）
         push_env = env if dockerhub_token else None
         
-        log(f"推送镜像: {image_tag}")
-        success, stdout, stderr = run_command(
-            f"{docker_cmd} push {image_tag}", 
-            env=push_env,
-            callback=log if callback else None
-        )
+        # 两个标签共享所有镜像层，并行推送；两路输出交错，每行加上标签前缀
+        def push(tag):
+            log(f"推送镜像: {tag}")
+            prefix = f"[{tag.rsplit(':', 1)[-1]}] "
+            return run_command(
+                [docker_cmd, 'push', tag],
+                env=push_env,
+                callback=(lambda line: log(prefix + line)) if callback else None
+            )
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            push_future = executor.submit(push, image_tag)
+            latest_future = executor.submit(push, latest_tag)
+            success, stdout, stderr = push_future.result()
+            latest_success, latest_stdout, latest_stderr = latest_future.result()
+        
+        failed_output = ''
         if not success:
-            return False, f"推送失败: {stderr}"
+            failed_output += stdout + stderr
+        if not latest_success:
+            failed_output += latest_stdout + latest_stderr
+        if is_push_auth_error(failed_output):
+            clear_login_cache()
+            log("推送鉴权失败，已清除DockerHub登录缓存，下次发布将重新登录")
         
-        log(f"推送镜像: {latest_tag}")
-        success, stdout, stderr = run_command(
-            f"{docker_cmd} push {latest_tag}", 
-            env=push_env,
-            callback=log if callback else None
-        )
         if not success:
-            return False, f"推送latest标签失败: {stderr}"
+            if latest_success:
+                # latest已指向新镜像，但对应的版本标签不存在，需要明确告知
+                log(f"⚠️ latest标签已推送，但版本标签 {version} 推送失败，latest暂时没有对应的版本号")
+                return False, f"推送失败（latest已更新，版本标签未推送）: {stderr}"
+            return False, f"推送失败: {stderr}"
+        if not latest_success:
+            return False, f"推送latest标签失败（版本标签已推送）: {latest_stderr}"
         
         log("✅ 发布成功!")
         log(f"镜像地址: {image_tag}")
@@ -395,17 +1085,62 @@ def build_and_push_image(app_name, version, dist_file_path, username=None, token
         return False, f"发布过程出错: {str(e)}"
     finally:
         # 清理构建目录
-        if build_dir.exists():
-            try:
-                shutil.rmtree(build_dir)
-                log(f"清理构建目录: {build_dir}")
-            except Exception as e:
-                log(f"清理构建目录失败: {e}")
+        try:
+            build_ctx.cleanup()
+            log(f"清理构建目录: {build_dir}")
+        except Exception as e:
+            log(f"清理构建目录失败: {e}")
+
+# zip目录结构缓存的最大条目数
+ZIP_STRUCT_CACHE_SIZE = 8
+
+# 日志刷新间隔（毫秒）及每批最大字节数
+LOG_FLUSH_INTERVAL_MS = 100
+LOG_BATCH_MAX_BYTES = 64 * 1024
+# 日志控件超过最大行数时只保留最近的行
+LOG_MAX_LINES = 2000
+LOG_KEEP_LINES = 1500
+
+# 构建历史保存合并延迟（毫秒）
+BUILDS_SAVE_DELAY_MS = 500
+
+
+def parse_version(version):
+    """把 v1.2.3 形式的版本号解析为整数元组，无法解析时返回None"""
+    try:
+        return tuple(int(x) for x in version.replace('v', '').split('.'))
+    except (AttributeError, ValueError):
+        return None
 
 class PublisherGUI:
     """GUI界面类"""
     
+    # 配置项与输入控件变量的对应关系：(配置键, 变量属性名, 默认值)
+    # 默认值为None时，配置为空则保留控件的初始值
+    _SETTINGS_BINDINGS = (
+        ('DOCKERHUB_USERNAME', 'username_var', ''),
+        ('DOCKERHUB_TOKEN', 'token_var', ''),
+        ('MAINTAINER', 'maintainer_var', 'DevOps Team'),
+        ('SERVICE_PREFIX', 'service_prefix_var', 'hzxy'),
+        ('BASE_IMAGE_NAME', 'base_image_name_var', 'hzxy-webapp-base'),
+        # JS底座配置
+        ('REMOTE_URL', 'remote_url_var', None),
+        ('REMOTE_USERNAME', 'remote_username_var', None),
+        ('REMOTE_PASSWORD', 'remote_password_var', None),
+        # 登录接口配置
+        ('LOGIN_URL', 'login_url_var', None),
+        ('REQUEST_METHOD', 'request_method_var', None),
+        ('CONTENT_TYPE', 'content_type_var', None),
+        ('TOKEN_PATH', 'token_path_var', None),
+    )
+    # 多行文本配置项：(配置键, 文本控件属性名)
+    _TEXT_SETTINGS_BINDINGS = (
+        ('CALLBACK_METHOD', 'callback_text'),
+        ('REQUEST_PARAMS', 'request_params_text'),
+    )
+    
     def __init__(self):
+        import_gui_modules()
         self.root = tk.Tk()
         self.root.title("HZXY WEB应用容器发布工具")
         self.root.geometry("1000x800")
@@ -417,15 +1152,26 @@ class PublisherGUI:
         
         # 构建历史数据
         self.builds = []  # 存储构建历史
+        self._builds_by_id = {}  # 列表项iid -> 构建记录
+        self._latest_version_by_app = {}  # 应用名 -> 已发布的最高版本号元组
+        self._refresh_in_progress = False  # 是否正在后台查询容器状态
+        self._refresh_pending = False  # 查询期间是否又收到刷新请求
+        self._save_builds_job = None  # 待执行的构建历史保存任务
+        self._serialized_builds = {}  # id(构建记录) -> (构建记录, 序列化后的JSON字节)
         self.builds_tree = None  # 构建列表树形控件
         self.builds_file = os.path.expanduser("~/.hzxy-builds.json")
         self.structure_tree = None  # 目录结构树形控件
+        self._zip_struct_cache = OrderedDict()  # zip目录结构解析缓存
+        self._zip_struct_request = None  # 当前待显示的zip缓存键
         self.log_text = False  # 日志文本控件
+        self._log_queue = queue.Queue()  # 待刷新的日志行（可跨线程写入）
+        self._ts_cache = (0, '')  # (秒级时间戳, 格式化后的时间)，同一秒内的日志复用
         
         # JS底座临时文件管理
         self.js_base_temp_dir = None
         
         self.setup_ui()
+        self.root.after(LOG_FLUSH_INTERVAL_MS, self._drain_log_queue)
         self.load_settings()
         self.load_builds()
     
@@ -482,7 +1228,8 @@ class PublisherGUI:
         base_image_name_entry.grid(row=4, column=1, sticky=(tk.W, tk.E), padx=(0, 10), pady=(5, 0))
         base_image_name_entry.insert(0, "hzxy-webapp-base")
         
-        ttk.Button(config_frame, text="保存配置", command=self.save_settings).grid(row=0, column=2, rowspan=5)
+        ttk.Button(config_frame, text="保存配置", command=self.save_settings).grid(row=0, column=2, rowspan=3)
+        ttk.Button(config_frame, text="检测Docker", command=self.redetect_docker).grid(row=3, column=2, rowspan=2)
         
         # JS底座配置
         js_base_frame = ttk.LabelFrame(left_panel, text="JS底座配置", padding="10")
@@ -664,76 +1411,116 @@ function getAuthToken(username, password) {
         main_frame.rowconfigure(1, weight=1)
     
     def show_zip_structure(self, zip_path):
-        """显示zip文件的目录结构"""
-        print("show_zip_structure")
+        """显示zip文件的目录结构（解析在后台线程进行，不阻塞界面）"""
         if not self.structure_tree:
             return
             
         try:
-            # 清空现有内容
-            for item in self.structure_tree.get_children():
-                self.structure_tree.delete(item)
-            print("XXXXXX")
-            # 读取zip文件内容
-            with zipfile.ZipFile(zip_path, 'r') as zip_file:
-                print("YYYYYYY")
-                file_list = zip_file.namelist()
-                
-                print("\n=== ZIP文件内容调试 ===")
-                print(f"原始文件列表 ({len(file_list)}个):")
-                for i, f in enumerate(file_list):
-                    print(f"  {i}: '{f}'")
-                
-                # 构建树形结构
-                nodes = {}
-                print("\n=== 路径解析调试 ===")
-                
-                for file_path in sorted(file_list):
-                    if not file_path or file_path == '.':
-                        continue
-                        
-                    parts = [p for p in file_path.split('/') if p]  # 过滤空字符串
-                    print(f"\n文件路径: '{file_path}' -> 部分: {parts}")
+            # 按 (路径, 大小, 修改时间) 缓存解析结果，重复选择同一文件时无需再读zip
+            st = os.stat(zip_path)
+            cache_key = (zip_path, st.st_size, st.st_mtime_ns)
+        except Exception as e:
+            self._show_zip_error(e)
+            return
+        
+        self._zip_struct_request = cache_key
+        cached = self._zip_struct_cache.get(cache_key)
+        if cached is not None:
+            self._zip_struct_cache.move_to_end(cache_key)
+            self._show_zip_rows(cache_key, cached)
+            return
+        
+        self.structure_tree.delete(*self.structure_tree.get_children())
+        self.structure_tree.insert('', 'end', text="⏳ 正在读取...")
+        threading.Thread(target=self._parse_zip_worker, args=(cache_key,), daemon=True).start()
+    
+    def _parse_zip_worker(self, cache_key):
+        """zip解析工作线程"""
+        try:
+            result = self._parse_zip_structure(cache_key[0])
+        except Exception as e:
+            self.root.after(0, self._show_zip_error, e, cache_key)
+            return
+        self.root.after(0, self._on_zip_parsed, cache_key, result)
+    
+    def _on_zip_parsed(self, cache_key, result):
+        """在主线程中缓存解析结果并显示"""
+        self._zip_struct_cache[cache_key] = result
+        if len(self._zip_struct_cache) > ZIP_STRUCT_CACHE_SIZE:
+            self._zip_struct_cache.popitem(last=False)
+        self._show_zip_rows(cache_key, result)
+    
+    def _show_zip_rows(self, cache_key, result):
+        """显示解析结果（期间已选择其他文件时忽略）"""
+        if cache_key != self._zip_struct_request:
+            return
+        rows, file_count = result
+        self._apply_tree_nodes(rows)
+        self.log_message(f"已显示zip文件结构: {file_count}个文件")
+    
+    def _show_zip_error(self, error, cache_key=None):
+        """显示zip读取错误"""
+        if cache_key is not None and cache_key != self._zip_struct_request:
+            return
+        self.log_message(f"读取zip文件失败: {error}")
+        # 显示错误信息
+        self.structure_tree.delete(*self.structure_tree.get_children())
+        self.structure_tree.insert('', 'end', text=f"❌ 读取失败: {str(error)}")
+    
+    def _parse_zip_structure(self, zip_path):
+        """解析zip目录结构，返回 ([(父路径, 路径, 名称, 是否目录, 层级)], 文件数)"""
+        import zipfile
+        
+        rows = []
+        seen = set()
+        file_count = 0
+        with zipfile.ZipFile(zip_path, 'r') as zip_file:
+            # 逐条遍历中央目录，不生成完整列表也不全局排序
+            for info in zip_file.infolist():
+                file_path = info.filename
+                file_count += 1
+                if not file_path or file_path == '.':
+                    continue
                     
-                    # 逐级构建路径
-                    for i in range(len(parts)):
-                        current_parts = parts[:i+1]
-                        current_path = '/'.join(current_parts)
-                        
-                        if current_path not in nodes:
-                            # 确定父节点
-                            if i == 0:
-                                parent_id = ''
-                                parent_path = 'ROOT'
-                            else:
-                                parent_path = '/'.join(parts[:i])
-                                parent_id = nodes.get(parent_path, '')
-                            
-                            part_name = parts[i]
-                            
-                            # 判断是文件还是目录
-                            is_dir = (i < len(parts) - 1) or file_path.endswith('/')
-                            icon = '📁' if is_dir else '📄'
-                            
-                            print(f"  创建节点: '{part_name}' (路径: {current_path}, 父: {parent_path}, 类型: {'目录' if is_dir else '文件'})")
-                            
-                            node_id = self.structure_tree.insert(
-                                parent_id, 'end', 
-                                text=f"{icon} {part_name}",
-                                open=True if i < 2 else False  # 前两层默认展开
-                            )
-                            nodes[current_path] = node_id
-                
-                print("\n=== 最终节点映射 ===")
-                for path, node_id in nodes.items():
-                    print(f"  '{path}' -> {node_id}")
+                parts = file_path.strip('/').split('/')
+                # 逐级构建路径（增量拼接前缀，避免每层重复join）
+                prefix = ''
+                for i, part_name in enumerate(parts):
+                    parent_path = prefix
+                    prefix = part_name if not prefix else prefix + '/' + part_name
+                    
+                    if prefix not in seen:
+                        seen.add(prefix)
+                        # 判断是文件还是目录
+                        is_dir = (i < len(parts) - 1) or file_path.endswith('/')
+                        rows.append((parent_path, prefix, part_name, is_dir, i))
+        return rows, file_count
+    
+    def _apply_tree_nodes(self, rows):
+        """将解析出的目录结构插入树形控件"""
+        # 插入期间暂时隐藏控件，避免每次插入都触发重绘
+        self.structure_tree.grid_remove()
+        try:
+            # 清空现有内容
+            self.structure_tree.delete(*self.structure_tree.get_children())
+            nodes = {'': ''}
+            children = {}  # 父节点ID -> 已插入的有序子节点名称
+            for parent_path, current_path, part_name, is_dir, depth in rows:
+                parent_id = nodes.get(parent_path, '')
+                icon = '📁' if is_dir else '📄'
                 
-                self.log_message(f"已显示zip文件结构: {len(file_list)}个文件")
+                # 按名称有序插入到父节点下
+                siblings = children.setdefault(parent_id, [])
+                index = bisect.bisect(siblings, part_name)
+                siblings.insert(index, part_name)
                 
-        except Exception as e:
-            self.log_message(f"读取zip文件失败: {e}")            
-            # 显示错误信息
-            self.structure_tree.insert('', 'end', text=f"❌ 读取失败: {str(e)}")
+                nodes[current_path] = self.structure_tree.insert(
+                    parent_id, index, 
+                    text=f"{icon} {part_name}",
+                    open=depth < 2  # 前两层默认展开
+                )
+        finally:
+            self.structure_tree.grid()
     
     def show_build_structure(self, build):
         """显示构建的目录结构"""
@@ -742,12 +1529,12 @@ function getAuthToken(username, password) {
             
         try:
             # 清空现有内容
-            for item in self.structure_tree.get_children():
-                self.structure_tree.delete(item)
+            self.structure_tree.delete(*self.structure_tree.get_children())
             
             if 'file_path' in build and os.path.exists(build['file_path']):
                 self.show_zip_structure(build['file_path'])
             else:
+                self._zip_struct_request = None
                 self.structure_tree.insert('', 'end', text="❌ 源文件不存在")
                 
         except Exception as e:
@@ -755,17 +1542,40 @@ function getAuthToken(username, password) {
             self.structure_tree.insert('', 'end', text=f"❌ 显示失败: {str(e)}")
     
     def log_message(self, message):
-        """添加日志消息"""
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
-        if not self.log_text:
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
-            return
-            
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, f"[{datetime.now().strftime('%H:%M:%S')}] {message}\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
-        self.root.update_idletasks()
+        """添加日志消息（线程安全，只写入队列，由主线程定时批量刷新到界面）"""
+        now = int(time.time())
+        ts_cache = self._ts_cache
+        if ts_cache[0] != now:
+            ts_cache = self._ts_cache = (now, time.strftime('%H:%M:%S', time.localtime(now)))
+        line = f"[{ts_cache[1]}] {message}"
+        print(line)
+        self._log_queue.put(line)
+    
+    def _drain_log_queue(self):
+        """定时从日志队列取出消息，合并为一次插入"""
+        lines = []
+        size = 0
+        while size < LOG_BATCH_MAX_BYTES:
+            try:
+                line = self._log_queue.get_nowait()
+            except queue.Empty:
+                break
+            lines.append(line)
+            size += len(line)
+        
+        if lines and self.log_text:
+            self.log_text.config(state=tk.NORMAL)
+            self.log_text.insert(tk.END, '\n'.join(lines) + '\n')
+            # 限制日志行数，避免控件内容无限增长导致卡顿
+            line_count = int(self.log_text.index('end-1c').split('.')[0])
+            if line_count > LOG_MAX_LINES:
+                self.log_text.delete('1.0', f'{line_count - LOG_KEEP_LINES}.0')
+            self.log_text.see(tk.END)
+            self.log_text.config(state=tk.DISABLED)
+        
+        # 队列中仍有积压时尽快继续刷新
+        delay = 10 if size >= LOG_BATCH_MAX_BYTES else LOG_FLUSH_INTERVAL_MS
+        self.root.after(delay, self._drain_log_queue)
     
     def clear_log(self):
         """清空日志"""
@@ -781,110 +1591,136 @@ function getAuthToken(username, password) {
         )
         if file_path:
             self.file_path_var.set(file_path)
-            # 显示zip文件内容
+            # 显示zip文件内容（后台线程解析，立即返回）
             self.show_zip_structure(file_path)
     
     def save_settings(self):
         """保存设置"""
-        CONFIG['DOCKERHUB_USERNAME'] = self.username_var.get().strip()
-        CONFIG['DOCKERHUB_TOKEN'] = self.token_var.get().strip()
-        CONFIG['MAINTAINER'] = self.maintainer_var.get().strip()
-        CONFIG['SERVICE_PREFIX'] = self.service_prefix_var.get().strip()
-        CONFIG['BASE_IMAGE_NAME'] = self.base_image_name_var.get().strip()
-        # 保存JS底座配置
-        CONFIG['REMOTE_URL'] = self.remote_url_var.get().strip()
-        CONFIG['REMOTE_USERNAME'] = self.remote_username_var.get().strip()
-        CONFIG['REMOTE_PASSWORD'] = self.remote_password_var.get().strip()
-        CONFIG['CALLBACK_METHOD'] = self.callback_text.get('1.0', tk.END).strip()
-        # 保存登录接口配置
-        CONFIG['LOGIN_URL'] = self.login_url_var.get().strip()
-        CONFIG['REQUEST_METHOD'] = self.request_method_var.get().strip()
-        CONFIG['CONTENT_TYPE'] = self.content_type_var.get().strip()
-        CONFIG['REQUEST_PARAMS'] = self.request_params_text.get('1.0', tk.END).strip()
-        CONFIG['TOKEN_PATH'] = self.token_path_var.get().strip()
+        for key, attr, _ in self._SETTINGS_BINDINGS:
+            CONFIG[key] = getattr(self, attr).get().strip()
+        for key, attr in self._TEXT_SETTINGS_BINDINGS:
+            CONFIG[key] = getattr(self, attr).get('1.0', tk.END).strip()
         save_config()
+        refresh_docker_command()
         self.log_message("配置已保存")
         messagebox.showinfo("成功", "配置已保存")
     
+    def redetect_docker(self):
+        """重新检测Docker命令（Docker路径结果默认会被缓存）"""
+        docker_cmd = refresh_docker_command()
+        if docker_cmd:
+            self.log_message(f"已检测到Docker: {docker_cmd}")
+        else:
+            self.log_message("❌ 未找到Docker命令")
+    
     def load_settings(self):
         """加载设置"""
         load_config()
-        self.username_var.set(CONFIG['DOCKERHUB_USERNAME'])
-        # Token不显示明文，但保留实际值
-        if CONFIG['DOCKERHUB_TOKEN']:
-            self.token_var.set(CONFIG['DOCKERHUB_TOKEN'])  # 保留实际token值
-        else:
-            self.token_var.set("")
-        # 加载maintainer设置
-        if CONFIG.get('MAINTAINER'):
-            self.maintainer_var.set(CONFIG['MAINTAINER'])
-        else:
-            self.maintainer_var.set("DevOps Team")
-        # 加载服务前缀设置
-        if CONFIG.get('SERVICE_PREFIX'):
-            self.service_prefix_var.set(CONFIG['SERVICE_PREFIX'])
-        else:
-            self.service_prefix_var.set("hzxy")
-        # 加载基础镜像名称设置
-        if CONFIG.get('BASE_IMAGE_NAME'):
-            self.base_image_name_var.set(CONFIG['BASE_IMAGE_NAME'])
-        else:
-            self.base_image_name_var.set("hzxy-webapp-base")
-        
-        # 加载JS底座配置
-        if CONFIG.get('REMOTE_URL'):
-            self.remote_url_var.set(CONFIG['REMOTE_URL'])
-        if CONFIG.get('REMOTE_USERNAME'):
-            self.remote_username_var.set(CONFIG['REMOTE_USERNAME'])
-        if CONFIG.get('REMOTE_PASSWORD'):
-            self.remote_password_var.set(CONFIG['REMOTE_PASSWORD'])
-        if CONFIG.get('CALLBACK_METHOD'):
-            self.callback_text.delete('1.0', tk.END)
-            self.callback_text.insert('1.0', CONFIG['CALLBACK_METHOD'])
-        
-        # 加载登录接口配置
-        if CONFIG.get('LOGIN_URL'):
-            self.login_url_var.set(CONFIG['LOGIN_URL'])
-        if CONFIG.get('REQUEST_METHOD'):
-            self.request_method_var.set(CONFIG['REQUEST_METHOD'])
-        if CONFIG.get('CONTENT_TYPE'):
-            self.content_type_var.set(CONFIG['CONTENT_TYPE'])
-        if CONFIG.get('REQUEST_PARAMS'):
-            self.request_params_text.delete('1.0', tk.END)
-            self.request_params_text.insert('1.0', CONFIG['REQUEST_PARAMS'])
-        if CONFIG.get('TOKEN_PATH'):
-            self.token_path_var.set(CONFIG['TOKEN_PATH'])
+        for key, attr, default in self._SETTINGS_BINDINGS:
+            value = CONFIG.get(key) or default
+            if value is not None:
+                getattr(self, attr).set(value)
+        for key, attr in self._TEXT_SETTINGS_BINDINGS:
+            if CONFIG.get(key):
+                text = getattr(self, attr)
+                text.delete('1.0', tk.END)
+                text.insert('1.0', CONFIG[key])
     
     def load_builds(self):
         """加载构建历史"""
         try:
-            if os.path.exists(self.builds_file):
-                with open(self.builds_file, 'r', encoding='utf-8') as f:
-                    self.builds = json.load(f)
-            else:
+            try:
+                with open(self.builds_file, 'rb') as f:
+                    self.builds = load_json(f.read())
+            except FileNotFoundError:
                 self.builds = []
+            self._index_published_versions()
             self.refresh_builds_list()
         except Exception as e:
             self.log_message(f"加载构建历史失败: {e}")
             self.builds = []
             self.refresh_builds_list()
     
-    def save_builds(self):
-        """保存构建历史"""
+    def _index_published_versions(self):
+        """从构建历史中汇总每个应用已发布的最高版本号"""
+        self._latest_version_by_app = {}
+        for build in self.builds:
+            self._note_published_version(build['app_name'], build.get('published_version'))
+    
+    def _note_published_version(self, app_name, version):
+        """记录一次发布，仅在版本号更高时更新"""
+        parsed = parse_version(version) if version else None
+        if parsed is None:
+            return
+        latest = self._latest_version_by_app.get(app_name)
+        if latest is None or parsed > latest:
+            self._latest_version_by_app[app_name] = parsed
+    
+    def save_builds(self, changed_build=None):
+        """保存构建历史（短时间内的多次修改合并为一次写入，只能在Tk主线程调用）
+        
+        changed_build: 被修改的构建记录，只让它的序列化缓存失效；
+                       不传时清空全部缓存，下次写入时重新序列化所有记录
+        """
+        if changed_build is not None:
+            self._serialized_builds.pop(id(changed_build), None)
+        else:
+            self._serialized_builds.clear()
+        if self._save_builds_job is None:
+            self._save_builds_job = self.root.after(BUILDS_SAVE_DELAY_MS, self._write_builds)
+    
+    def _write_builds(self):
+        """将构建历史写入文件"""
+        self._save_builds_job = None
         try:
-            with open(self.builds_file, 'w', encoding='utf-8') as f:
-                json.dump(self.builds, f, ensure_ascii=False, indent=2)
+            # 逐条复用未修改记录的序列化结果，只重新序列化变化的记录
+            cache = {}
+            chunks = []
+            for build in self.builds:
+                entry = self._serialized_builds.get(id(build))
+                if entry is None or entry[0] is not build:
+                    entry = (build, dump_json(build, compact=True))
+                cache[id(build)] = entry
+                chunks.append(entry[1])
+            self._serialized_builds = cache
+            write_file_atomic(self.builds_file, b'[' + b','.join(chunks) + b']')
         except Exception as e:
             self.log_message(f"保存构建历史失败: {e}")
     
     def refresh_builds_list(self):
-        """刷新构建列表显示"""
+        """刷新构建列表显示（容器状态在后台线程查询，刷新进行中时合并重复请求）"""
         if not self.builds_tree:
             return
-            
+        
+        if not any('container_name' in b for b in self.builds):
+            self._populate_builds_list({})
+            return
+        
+        if self._refresh_in_progress:
+            self._refresh_pending = True
+            return
+        self._refresh_in_progress = True
+        threading.Thread(target=self._refresh_builds_worker, daemon=True).start()
+    
+    def _refresh_builds_worker(self):
+        """查询容器状态的工作线程"""
+        statuses = get_all_container_statuses()
+        self.root.after(0, self._on_container_statuses, statuses)
+    
+    def _on_container_statuses(self, statuses):
+        """在主线程中用查询到的容器状态刷新列表"""
+        self._refresh_in_progress = False
+        self._populate_builds_list(statuses)
+        if self._refresh_pending:
+            # 查询期间又有刷新请求，重新查询以获取最新状态
+            self._refresh_pending = False
+            self.refresh_builds_list()
+    
+    def _populate_builds_list(self, statuses):
+        """填充构建列表"""
         # 清空现有项目
-        for item in self.builds_tree.get_children():
-            self.builds_tree.delete(item)
+        self.builds_tree.delete(*self.builds_tree.get_children())
+        self._builds_by_id = {}
         
         # 添加构建项目
         self.log_message(f"加载构建历史: 共{len(self.builds)}个构建记录")
@@ -894,7 +1730,7 @@ function getAuthToken(username, password) {
             test_url = ""
             
             if 'container_name' in build:
-                status = get_container_status(build['container_name'])
+                status = statuses.get(build['container_name'])
                 if status and status.get('running'):
                     container_status = "运行中"
                     test_url = build.get('test_url', '')
@@ -903,7 +1739,13 @@ function getAuthToken(username, password) {
                 else:
                     container_status = "未运行"
             
-            self.builds_tree.insert('', 'end', values=(
+            # 以构建ID作为列表项iid，选中时可直接取回构建记录
+            build_id = build.get('id') or f"{build['app_name']}_{build['build_time']}"
+            while build_id in self._builds_by_id:
+                build_id += '_'
+            self._builds_by_id[build_id] = build
+            
+            self.builds_tree.insert('', 'end', iid=build_id, values=(
                 build['app_name'],
                 build['build_time'],
                 build['status'],
@@ -975,13 +1817,13 @@ function getAuthToken(username, password) {
                 build_record['status'] = '构建失败'
                 self.log_message(f"❌ 构建失败: {build_record['app_name']}")
             
-            self.save_builds()
+            self.root.after(0, self.save_builds, build_record)
             self.root.after(0, self.refresh_builds_list)
             
         except Exception as e:
             build_record['status'] = '构建失败'
             self.log_message(f"构建异常: {e}")
-            self.save_builds()
+            self.root.after(0, self.save_builds, build_record)
             self.root.after(0, self.refresh_builds_list)
         finally:
             self.root.after(0, lambda: self.build_btn.config(state='normal'))
@@ -994,32 +1836,18 @@ function getAuthToken(username, password) {
             messagebox.showwarning("警告", "请先选择一个构建项目")
             return None
         
-        item = self.builds_tree.item(selection[0])
-        values = item['values']
-        app_name, build_time = values[0], values[1]
-        
-        # 确保build_time是字符串类型
-        build_time = str(build_time)
-        self.log_message(f"选中的构建: '{app_name}' - '{build_time}' (类型: {type(build_time)})")
-        
-        # 查找对应的构建记录
-        for build in self.builds:
-            # self.log_message(f"比较构建记录: '{build['app_name']}' - '{build['build_time']}' (类型: {type(build['build_time'])})")
-            
-            # 处理时间格式差异：移除下划线进行比较
-            stored_time = build['build_time'].replace('_', '')
-            selected_time = build_time.replace('_', '')
-            
-            # self.log_message(f"格式化后比较: '{stored_time}' vs '{selected_time}'")
-            # self.log_message(f"app_name匹配: {build['app_name'] == app_name}, build_time匹配: {stored_time == selected_time}")
-            
-            if build['app_name'] == app_name and stored_time == selected_time:
-                self.log_message(f"找到匹配的构建记录: {build}")
-                return build
+        build = self._lookup_build(selection[0])
+        if build:
+            self.log_message(f"找到匹配的构建记录: {build}")
+            return build
         
         self.log_message("未找到匹配的构建记录")
         return None
     
+    def _lookup_build(self, item_id):
+        """根据列表项iid查找构建记录"""
+        return self._builds_by_id.get(item_id)
+    
     def test_selected_build(self):
         """测试选中的构建"""
         self.log_message("🧪 本地测试按钮被点击")
@@ -1039,40 +1867,17 @@ function getAuthToken(username, password) {
         try:
             self.log_message(f"开始本地测试: {build['docker_image']}")
             
-            # 停止可能存在的同名容器
-            docker_cmd = find_docker_command()
-            if not docker_cmd:
-                self.log_message("❌ 未找到Docker命令")
-                return
-
             container_name = f"test_{build['app_name']}_{build['build_time']}"
             
-            # 停止并删除现有容器
-            subprocess.run([docker_cmd, 'stop', container_name], capture_output=True)
-            subprocess.run([docker_cmd, 'rm', container_name], capture_output=True)
-            
-            # 获取可用端口
-            port = get_available_port()
-            if not port:
-                self.log_message("❌ 无法找到可用端口")
-                return
-            
-            # 启动新容器
-            cmd = [
-                docker_cmd, 'run', '-d',
-                '--name', container_name,
-                '-p', f'{port}:80',
-                build['docker_image']
-            ]
+            # 删除同名旧容器后启动新容器，宿主机端口由Docker分配
+            port, error = start_test_container(build['docker_image'], container_name)
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
+            if error is None:
                 # 保存容器信息到构建记录
                 build['container_name'] = container_name
                 build['test_port'] = port
                 build['test_url'] = f'http://localhost:{port}'
-                self.save_builds()
+                self.root.after(0, self.save_builds, build)
                 
                 self.log_message(f"✅ 测试容器启动成功: {container_name}")
                 self.log_message(f"🌐 访问地址: http://localhost:{port}")
@@ -1081,7 +1886,7 @@ function getAuthToken(username, password) {
                 # 刷新构建列表显示
                 self.root.after(0, self.refresh_builds_list)
             else:
-                self.log_message(f"❌ 测试容器启动失败: {result.stderr}")
+                self.log_message(f"❌ 测试容器启动失败: {error}")
                 
         except Exception as e:
             self.log_message(f"测试异常: {e}")
@@ -1144,39 +1949,30 @@ function getAuthToken(username, password) {
                 return
             
             dialog.destroy()
-            threading.Thread(target=self._publish_worker, args=(build, version), daemon=True).start()
+            # Tk变量只能在主线程读取，读取后再交给工作线程
+            username = self.username_var.get().strip()
+            token = self.token_var.get().strip()
+            threading.Thread(target=self._publish_worker, args=(build, version, username, token), daemon=True).start()
         
         ttk.Button(button_frame, text="发布", command=on_publish).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side=tk.LEFT)
     
     def _get_recommended_version(self, app_name):
         """获取推荐的版本号"""
-        # 查找该应用的历史版本
-        versions = []
-        for build in self.builds:
-            if build['app_name'] == app_name and 'published_version' in build:
-                versions.append(build['published_version'])
-        
-        if not versions:
+        latest = self._latest_version_by_app.get(app_name)
+        if latest is None:
             return "v1.0.0"
         
-        # 解析版本号并自增
-        try:
-            latest_version = max(versions, key=lambda v: [int(x) for x in v.replace('v', '').split('.')])
-            parts = latest_version.replace('v', '').split('.')
-            parts[-1] = str(int(parts[-1]) + 1)
-            return f"v{'.'.join(parts)}"
-        except:
-            return "v1.0.0"
+        # 末位自增
+        parts = list(latest)
+        parts[-1] += 1
+        return f"v{'.'.join(map(str, parts))}"
     
-    def _publish_worker(self, build, version):
-        """发布工作线程"""
+    def _publish_worker(self, build, version, username, token):
+        """发布工作线程（不直接访问Tk控件，日志经队列回到主线程）"""
         try:
             self.log_message(f"开始发布: {build['app_name']} -> {version}")
             
-            username = self.username_var.get().strip()
-            token = self.token_var.get().strip()
-            
             if not username or not token:
                 self.log_message("❌ 请先配置DockerHub用户名和Token")
                 return
@@ -1194,7 +1990,8 @@ function getAuthToken(username, password) {
             if success:
                 build['published_version'] = version
                 build['published_at'] = datetime.now().isoformat()
-                self.save_builds()
+                self._note_published_version(build['app_name'], version)
+                self.root.after(0, self.save_builds, build)
                 self.log_message(f"✅ 发布成功: {username}/{build['app_name']}:{version}")
             else:
                 self.log_message(f"❌ 发布失败: {message}")
@@ -1221,21 +2018,14 @@ function getAuthToken(username, password) {
         app_name = build['app_name']
         version = build['published_version']
         
-        service_prefix = CONFIG.get('SERVICE_PREFIX', 'hzxy')
-        template = f'''services:
-  {service_prefix}-{app_name}:
-    image: {username}/{CONFIG['BASE_IMAGE_NAME']}-{app_name}:{version}
-    container_name: {service_prefix}-{app_name}
-    ports:
-      - "3000:80"
-    restart: unless-stopped
-    networks:
-      - {service_prefix}-network
-
-networks:
-  {service_prefix}-network:
-    driver: bridge
-'''
+        template = COMPOSE_TMPL.substitute(
+            prefix=CONFIG.get('SERVICE_PREFIX', 'hzxy'),
+            app=app_name,
+            user=username,
+            base=CONFIG['BASE_IMAGE_NAME'],
+            ver=version,
+            port=3000,
+        )
         
         # 显示YAML预览和编辑窗口
         self._show_yaml_editor(template, f"docker-compose-{app_name}.yml")
@@ -1280,9 +2070,10 @@ networks:
         
         # 复制到剪贴板按钮
         def copy_to_clipboard():
-            content = text_area.get('1.0', tk.END)
+            # 'end-1c' 不含Tk自动追加的换行，无需再strip复制一次
+            content = text_area.get('1.0', 'end-1c')
             editor_window.clipboard_clear()
-            editor_window.clipboard_append(content.strip())
+            editor_window.clipboard_append(content)
             messagebox.showinfo("成功", "内容已复制到剪贴板")
         
         copy_btn = ttk.Button(button_frame, text="📋 复制到剪贴板", command=copy_to_clipboard)
@@ -1299,9 +2090,9 @@ networks:
             
             if file_path:
                 try:
-                    content = text_area.get('1.0', tk.END)
+                    content = text_area.get('1.0', 'end-1c')
                     with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(content.strip())
+                        f.write(content)
                     self.log_message(f"docker-compose模板已保存到: {file_path}")
                     messagebox.showinfo("成功", f"模板已保存到: {file_path}")
                 except Exception as e:
@@ -1340,29 +2131,24 @@ networks:
     def _stop_container_worker(self, build):
         """停止容器工作线程"""
         try:
-            docker_cmd = find_docker_command()
-            if not docker_cmd:
-                self.log_message("❌ 未找到Docker命令")
-                return
-            
             container_name = build['container_name']
             self.log_message(f"正在停止容器: {container_name}")
             
             # 停止容器
-            result = subprocess.run([docker_cmd, 'stop', container_name], capture_output=True, text=True)
+            error = stop_container(container_name)
             
-            if result.returncode == 0:
+            if error is None:
                 self.log_message(f"✅ 容器已停止: {container_name}")
                 # 清除容器相关信息
                 if 'test_port' in build:
                     del build['test_port']
                 if 'test_url' in build:
                     del build['test_url']
-                self.save_builds()
+                self.root.after(0, self.save_builds, build)
                 # 刷新构建列表
                 self.root.after(0, self.refresh_builds_list)
             else:
-                self.log_message(f"❌ 停止容器失败: {result.stderr}")
+                self.log_message(f"❌ 停止容器失败: {error}")
                 
         except Exception as e:
             self.log_message(f"停止容器异常: {e}")
@@ -1376,6 +2162,8 @@ networks:
         
         if messagebox.askyesno("确认删除", f"确定要删除构建 {build['app_name']} - {build['build_time']} 吗？"):
             self.builds.remove(build)
+            if 'published_version' in build:
+                self._index_published_versions()
             self.save_builds()
             self.refresh_builds_list()
             self.log_message(f"已删除构建: {build['app_name']} - {build['build_time']}")
@@ -1387,29 +2175,11 @@ networks:
         if not selection:
             return
         
-        item = self.builds_tree.item(selection[0])
-        values = item['values']
-        app_name, build_time = values[0], values[1]
-        
-        # 确保build_time是字符串类型
-        build_time = str(build_time)
-        self.log_message(f"选中的构建: '{app_name}' - '{build_time}' (类型: {type(build_time)})")
-        
-        # 查找对应的构建记录
-        for build in self.builds:
-            # self.log_message(f"比较构建记录: '{build['app_name']}' - '{build['build_time']}' (类型: {type(build['build_time'])})")
-            
-            # 处理时间格式差异：移除下划线进行比较
-            stored_time = build['build_time'].replace('_', '')
-            selected_time = build_time.replace('_', '')
-            
-            # self.log_message(f"格式化后比较: '{stored_time}' vs '{selected_time}'")
-            # self.log_message(f"app_name匹配: {build['app_name'] == app_name}, build_time匹配: {stored_time == selected_time}")
-            
-            if build['app_name'] == app_name and stored_time == selected_time:
-                self.log_message(f"找到匹配的构建记录: {build}")
-                self.show_build_structure(build)
-                return
+        build = self._lookup_build(selection[0])
+        if build:
+            self.log_message(f"找到匹配的构建记录: {build}")
+            self.show_build_structure(build)
+            return
         
         self.log_message("未找到匹配的构建记录")
     
@@ -1475,102 +2245,32 @@ networks:
             url_code = f"window.location.origin + '{login_url}'"
         
         # 生成完整的回调方法
-        callback_template = f"""// 自动生成的登录回调方法
-// 接口地址: {login_url}
-// 请求方法: {request_method}
-// Content-Type: {content_type}
-// Token路径: {token_path}
-function getAuthToken(username, password) {{
-    console.log('=== 开始登录请求 ===');
-    console.log('用户名:', username);
-    console.log('密码长度:', password ? password.length : 0);
-    
-    try {{
-        // 构建完整的登录URL
-        const loginUrl = {url_code};
-        console.log('登录URL:', loginUrl);
-        
-        // 构建请求体
-        const requestBody = {body_code};
-        console.log('请求体:', requestBody);
-        
-        // 发送登录请求
-        console.log('发送 {request_method} 请求...');
-        const xhr = new XMLHttpRequest();
-        xhr.open('{request_method}', loginUrl, false); // 同步请求
-        xhr.setRequestHeader('Content-Type', '{content_type_header}');
-        
-        xhr.send(requestBody);
-        
-        console.log('响应状态码:', xhr.status);
-        console.log('响应文本:', xhr.responseText);
-        
-        if (xhr.status === 200) {{
-            const response = JSON.parse(xhr.responseText);
-            console.log('解析后的响应:', response);
-            
-            // 根据配置的路径提取token
-            const token = {token_access_code};
-            console.log('提取的token:', token);
-            
-            if (token) {{
-                console.log('=== 登录成功 ===');
-                return {{
-                    token: token,
-                    success: true
-                }};
-            }} else {{
-                console.error('未找到token，路径:', '{token_path}');
-                console.error('响应结构:', JSON.stringify(response, null, 2));
-                return {{
-                    token: null,
-                    success: false,
-                    error: '未找到token'
-                }};
-            }}
-        }} else {{
-            console.error('登录失败，状态码:', xhr.status);
-            console.error('响应内容:', xhr.responseText);
-            return {{
-                token: null,
-                success: false,
-                error: '登录失败: ' + xhr.status
-            }};
-        }}
-    }} catch (error) {{
-        console.error('登录请求异常:', error);
-        console.error('错误堆栈:', error.stack);
-        return {{
-            token: null,
-            success: false,
-            error: '请求异常: ' + error.message
-        }};
-    }}
-}}"""
-        
-        return callback_template
+        return CALLBACK_CODE_TMPL.substitute(
+            login_url=login_url,
+            request_method=request_method,
+            content_type=content_type,
+            token_path=token_path,
+            url_code=url_code,
+            body_code=body_code,
+            content_type_header=content_type_header,
+            token_access_code=token_access_code,
+        )
     
     def _generate_token_access_code(self, token_path):
         """根据Token路径生成JavaScript访问代码"""
         if not token_path:
             return "response"
         
-        # 分割路径
-        path_parts = token_path.split('.')
-        
-        # 生成访问代码
-        access_code = "response"
-        for part in path_parts:
-            if part.strip():
-                access_code += f"['{part.strip()}']"
-        
-        return access_code
+        # 按路径逐级生成下标访问代码
+        parts = (part.strip() for part in token_path.split('.'))
+        return "response" + ''.join(f"['{part}']" for part in parts if part)
     
     def start_js_base(self):
         """启动JS底座"""
         if not WEBVIEW_AVAILABLE:
             messagebox.showerror("错误", "JS底座功能不可用，请安装依赖:\npip install pywebview requests")
             return
+        import_webview_modules()
         
         remote_url = self.remote_url_var.get().strip()
         remote_username = self.remote_username_var.get().strip()
@@ -1587,25 +2287,42 @@ function getAuthToken(username, password) {{
         
         self.log_message("正在启动JS底座...")
         
-        # 直接在主线程中启动JS底座
-        self._start_js_base_worker(remote_url, remote_username, remote_password, callback_method)
+        # HTML在后台线程生成并写入，webview必须在主线程启动（macOS限制），写入完成后切回主线程
+        threading.Thread(
+            target=self._start_js_base_worker,
+            args=(remote_url, remote_username, remote_password, callback_method),
+            daemon=True
+        ).start()
     
     def _start_js_base_worker(self, remote_url, username, password, callback_method):
-        """JS底座工作线程"""
+        """JS底座工作线程（只负责生成HTML页面文件）"""
         try:
-            # 清理之前的临时文件
-            self._cleanup_js_base_temp_files()
-            
             # 创建HTML页面
             html_content = self._create_js_base_html(remote_url, username, password, callback_method)
             
-            # 创建临时HTML文件
-            self.js_base_temp_dir = tempfile.mkdtemp()
+            # 临时目录只在首次启动时创建，之后复用并直接覆盖页面文件，程序退出时删除
+            if self.js_base_temp_dir is None:
+                self.js_base_temp_dir = tempfile.mkdtemp(prefix='jsbase_')
+                atexit.register(shutil.rmtree, self.js_base_temp_dir, ignore_errors=True)
             html_file = os.path.join(self.js_base_temp_dir, 'js_base.html')
             
-            with open(html_file, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            
+            # 一次编码、一次写入，不经过文本IO的编码和缓冲层
+            flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_CLOEXEC', 0) | getattr(os, 'O_BINARY', 0)
+            fd = os.open(html_file, flags, 0o600)
+            try:
+                os.write(fd, html_content.encode('utf-8'))
+            finally:
+                os.close(fd)
+        except Exception as e:
+            self.log_message(f"JS底座启动失败: {str(e)}")
+            self._cleanup_js_base_temp_files()
+            return
+        
+        self.root.after(0, self._show_js_base_window, html_file, remote_url)
+    
+    def _show_js_base_window(self, html_file, remote_url):
+        """在主线程中打开JS底座窗口"""
+        try:
             self.log_message(f"JS底座已启动，正在加载: {remote_url}")
             
             # 启动webview（启用调试模式）
@@ -1615,199 +2332,28 @@ function getAuthToken(username, password) {{
         except Exception as e:
             self.log_message(f"JS底座启动失败: {str(e)}")
         finally:
-            # webview关闭后清理临时文件
+            # webview关闭后删除页面文件（其中包含登录凭据）
             self._cleanup_js_base_temp_files()
     
     def _cleanup_js_base_temp_files(self):
-        """清理JS底座临时文件"""
-        if self.js_base_temp_dir and os.path.exists(self.js_base_temp_dir):
-            try:
-                shutil.rmtree(self.js_base_temp_dir)
-                self.js_base_temp_dir = None
-            except Exception as e:
-                self.log_message(f"清理临时文件失败: {str(e)}")
+        """删除JS底座页面文件（临时目录保留复用）"""
+        if not self.js_base_temp_dir:
+            return
+        try:
+            os.unlink(os.path.join(self.js_base_temp_dir, 'js_base.html'))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.log_message(f"清理临时文件失败: {str(e)}")
     
     def _create_js_base_html(self, remote_url, username, password, callback_method):
         """创建JS底座HTML页面"""
-        html_template = f"""
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>JS底座 - 远程站点免登录</title>
-    <style>
-        body {{
-            margin: 0;
-            padding: 0;
-            font-family: Arial, sans-serif;
-        }}
-        .header {{
-            background: #2c3e50;
-            color: white;
-            padding: 10px 20px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }}
-        .status {{
-            padding: 5px 10px;
-            border-radius: 3px;
-            font-size: 12px;
-        }}
-        .status.loading {{
-            background: #f39c12;
-        }}
-        .status.success {{
-            background: #27ae60;
-        }}
-        .status.error {{
-            background: #e74c3c;
-        }}
-        #remote-frame {{
-            width: 100%;
-            height: calc(100vh - 60px);
-            border: none;
-        }}
-        .loading {{
-            text-align: center;
-            padding: 50px;
-            font-size: 18px;
-            color: #7f8c8d;
-        }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h3>🌐 JS底座 - {remote_url}</h3>
-        <div style="display: flex; align-items: center; gap: 10px;">
-            <button id="login-btn" onclick="manualLogin()" style="
-                background: #3498db;
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-                cursor: pointer;
-                font-size: 12px;
-            ">🔑 手动登录</button>
-            <div id="status" class="status loading">等待手动登录...</div>
-        </div>
-    </div>
-    
-    <div id="loading" class="loading">
-        <p>正在获取访问令牌并加载远程站点...</p>
-        <p>目标地址: {remote_url}</p>
-    </div>
-    
-    <iframe id="remote-frame" style="display: none;"></iframe>
-    
-    <script>
-        // 用户提供的回调方法
-        {callback_method}
-        
-        // 主要逻辑
-        async function initializeJSBase() {{
-            const statusEl = document.getElementById('status');
-            const loadingEl = document.getElementById('loading');
-            const frameEl = document.getElementById('remote-frame');
-            
-            try {{
-                // 检查是否有有效的回调方法
-                if (typeof getAuthToken === 'function') {{
-                    statusEl.textContent = '正在获取访问令牌...';
-                    statusEl.className = 'status loading';
-                    
-                    // 调用用户定义的回调方法获取token
-                    const authResult = await getAuthToken('{username}', '{password}');
-                    
-                    if (!authResult || !authResult.success) {{
-                        throw new Error('获取访问令牌失败: ' + (authResult?.message || '未知错误'));
-                    }}
-                    
-                    const token = authResult.token;
-                    console.log('获取到访问令牌:', token);
-                    
-                    statusEl.textContent = '正在加载远程站点...';
-                    
-                    // 构建带token的URL
-                    const targetUrl = buildAuthenticatedUrl('{remote_url}', token);
-                    frameEl.src = targetUrl;
-                }} else {{
-                    // 没有回调方法，直接加载目标网站（测试模式）
-                    console.log('未找到getAuthToken方法，直接加载目标网站');
-                    statusEl.textContent = '直接加载模式...';
-                    statusEl.className = 'status loading';
-                    frameEl.src = '{remote_url}';
-                }}
-                
-                frameEl.onload = function() {{
-                    statusEl.textContent = '加载完成';
-                    statusEl.className = 'status success';
-                    loadingEl.style.display = 'none';
-                    frameEl.style.display = 'block';
-                    
-                    // 重新启用登录按钮
-                    const loginBtn = document.getElementById('login-btn');
-                    loginBtn.disabled = false;
-                    loginBtn.textContent = '🔄 重新登录';
-                }};
-                
-                frameEl.onerror = function() {{
-                    throw new Error('远程站点加载失败');
-                }};
-                
-            }} catch (error) {{
-                console.error('JS底座初始化失败:', error);
-                statusEl.textContent = '加载失败: ' + error.message;
-                statusEl.className = 'status error';
-                loadingEl.innerHTML = `
-                    <p style="color: #e74c3c;">❌ 加载失败</p>
-                    <p>错误信息: ${{error.message}}</p>
-                    <p>请检查回调方法实现和网络连接</p>
-                    <p>如果没有实现getAuthToken方法，将尝试直接加载目标网站</p>
-                `;
-                
-                // 重新启用登录按钮
-                const loginBtn = document.getElementById('login-btn');
-                loginBtn.disabled = false;
-                loginBtn.textContent = '🔑 重试登录';
-            }}
-        }}
-        
-        // 构建带认证信息的URL
-        function buildAuthenticatedUrl(baseUrl, token) {{
-            const url = new URL(baseUrl);
-            // 可以根据需要调整token的传递方式
-            // 方式1: 作为查询参数
-            url.searchParams.set('token', token);
-            // 方式2: 作为hash参数
-            // url.hash = 'token=' + token;
-            return url.toString();
-        }}
-        
-        // 手动登录函数
-         function manualLogin() {{
-             console.log('=== 手动触发登录流程 ===');
-             console.log('提示：请查看控制台获取详细日志');
-             
-             const loginBtn = document.getElementById('login-btn');
-             loginBtn.disabled = true;
-             loginBtn.textContent = '登录中...';
-             
-             initializeJSBase();
-         }}
-         
-         // 页面加载完成后准备就绪
-         document.addEventListener('DOMContentLoaded', function() {{
-             console.log('=== JS底座页面已加载 ===');
-             console.log('提示：请点击顶部的"手动登录"按钮开始登录流程');
-             console.log('或者打开开发者工具控制台查看详细日志');
-         }});
-    </script>
-</body>
-</html>
-        """
-        return html_template
+        return JS_BASE_HTML_TMPL.substitute(
+            remote_url=remote_url,
+            username=username,
+            password=password,
+            callback_method=callback_method,
+        )
     
     def on_build_double_click(self, event):
         """构建双击事件处理 - 打开访问地址"""
@@ -1817,7 +2363,7 @@ function getAuthToken(username, password) {{
         
         # 检查是否有运行中的容器
         if 'container_name' in build:
-            status = get_container_status(build['container_name'])
+            status = get_all_container_statuses().get(build['container_name'])
             if status and status.get('running'):
                 test_url = build.get('test_url', '')
                 if test_url:
@@ -1838,6 +2384,9 @@ function getAuthToken(username, password) {{
     def run(self):
         """运行GUI"""
         self.root.mainloop()
+        # 窗口关闭时写入尚未保存的构建历史
+        if self._save_builds_job is not None:
+            self._write_builds()
 
 # 命令行接口
 @click.group()
@@ -1865,6 +2414,10 @@ def start(gui):
 @click.argument('version')
 def publish(dist_file, app_name, version):
     """命令行发布应用"""
+    publish_app(dist_file, app_name, version)
+
+def publish_app(dist_file, app_name, version):
+    """发布应用（供click命令和argparse快速路径共用）"""
     if not os.path.exists(dist_file):
         click.echo(f"❌ 错误: 文件 {dist_file} 不存在")
         sys.exit(1)
@@ -1907,21 +2460,14 @@ def config():
 def template(app_name, port):
     """生成docker-compose模板"""
     load_config()  # 确保加载最新配置
-    service_prefix = CONFIG.get('SERVICE_PREFIX', 'hzxy')
-    template_content = f'''services:
-  {service_prefix}-{app_name}:
-    image: {CONFIG['DOCKERHUB_USERNAME'] or 'your_dockerhub_username'}/{CONFIG['BASE_IMAGE_NAME']}-{app_name}:latest
-    container_name: {service_prefix}-{app_name}
-    ports:
-      - "{port}:80"
-    restart: unless-stopped
-    networks:
-      - {service_prefix}-network
-
-networks:
-  {service_prefix}-network:
-    driver: bridge
-'''
+    template_content = COMPOSE_TMPL.substitute(
+        prefix=CONFIG.get('SERVICE_PREFIX', 'hzxy'),
+        app=app_name,
+        user=CONFIG['DOCKERHUB_USERNAME'] or 'your_dockerhub_username',
+        base=CONFIG['BASE_IMAGE_NAME'],
+        ver='latest',
+        port=port,
+    )
     
     filename = f"docker-compose-{app_name}.yml"
     with open(filename, 'w', encoding='utf-8') as f:
@@ -1931,6 +2477,17 @@ networks:
     click.echo(f"🚀 使用方法: docker compose -f {filename} up -d")
 
 if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == 'publish' and not ({'-h', '--help'} & set(sys.argv[2:])):
+        # publish快速路径：CI中高频调用，跳过click命令树解析
+        from argparse import ArgumentParser
+        parser = ArgumentParser(prog='app.py publish')
+        parser.add_argument('dist_file')
+        parser.add_argument('app_name')
+        parser.add_argument('version')
+        args = parser.parse_args(sys.argv[2:])
+        load_config()
+        publish_app(args.dist_file, args.app_name, args.version)
+        sys.exit(0)
     if len(sys.argv) == 1:
         # 如果没有参数，尝试启动GUI
         if GUI_AVAILABLE:
@@ -3,11 +3,20 @@
 """
 JS 插件注入调试服务
 提供静态资源服务或反向代理功能，并对 index.html 进行实时 JS 插件注入
+
+静态文件发送：
+- 独立运行时，send_from_directory 通过 wsgi.file_wrapper 发送文件，
+  waitress/gunicorn 等服务器会使用 sendfile(2) 直接从页缓存写入socket
+- 部署在 Apache/lighttpd 之后时可加 --x-sendfile，仅返回 X-Sendfile 头，由前端服务器发送文件
+  （nginx 使用 X-Accel-Redirect，需在 nginx 中配置 internal location 并自行改写该响应头，本服务不直接支持）
 """
 
 import os
 import re
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from http.cookiejar import CookieJar, DefaultCookiePolicy
 from flask import Flask, request, Response, send_from_directory, abort
 from urllib.parse import urljoin, urlparse
 import argparse
@@ -30,64 +39,169 @@ config = {
     'host': '0.0.0.0'
 }
 
-def load_plugin_content():
-    """加载JS插件内容"""
-    if not config['plugin_path'] or not os.path.exists(config['plugin_path']):
-        logger.error(f"插件文件不存在: {config['plugin_path']}")
+# --production 模式下waitress的工作线程数
+PRODUCTION_THREADS = 16
+
+# 代理共用的HTTP会话，复用与目标站点的连接
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=32, pool_maxsize=64))
+SESSION.mount('https://', HTTPAdapter(pool_connections=32, pool_maxsize=64))
+# 不在会话中保存Cookie，Cookie由浏览器通过请求头自行携带，避免不同客户端之间串用
+SESSION.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+# 目标站点URL（以 / 结尾），启动时计算一次
+_TARGET_BASE = None
+
+# 可选的httpx HTTP/2客户端（--http2 启用，多个请求复用同一连接），为None时使用上面的requests会话
+CLIENT = None
+# 视为上游请求失败（返回502）的异常类型，启用httpx后追加 httpx.HTTPError
+_UPSTREAM_ERRORS = (requests.exceptions.RequestException,)
+
+def create_http2_client():
+    """创建httpx HTTP/2客户端（需要 pip install 'httpx[http2]'，未安装时抛出ImportError）"""
+    import httpx
+    global _UPSTREAM_ERRORS
+    client = httpx.Client(
+        http2=True,
+        timeout=30.0,
+        follow_redirects=True,  # 与requests的默认行为保持一致
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        # 同requests会话，不在客户端中保存Cookie
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+    )
+    _UPSTREAM_ERRORS = (requests.exceptions.RequestException, httpx.HTTPError)
+    return client
+
+def _send_upstream(method, url, headers, data):
+    """向目标站点发送请求，返回 (响应, 响应体分块迭代器)，响应体尚未读取"""
+    if CLIENT is not None:
+        resp = CLIENT.send(CLIENT.build_request(method, url, headers=headers, content=data), stream=True)
+        return resp, resp.iter_bytes(PROXY_CHUNK_SIZE)
+    resp = SESSION.request(method, url, headers=headers, data=data, stream=True, timeout=30)
+    return resp, resp.iter_content(chunk_size=PROXY_CHUNK_SIZE)
+
+# 代理转发时需要移除的请求头/响应头（小写比较，上游可能返回小写头名）
+# 请求头额外去掉逐跳头部：它们只对客户端到本服务的连接有效，HTTP/2下转发还会被视为协议错误
+_SKIP_REQUEST_HEADERS = frozenset(('host', 'content-length', 'connection', 'keep-alive',
+                                   'proxy-connection', 'te', 'trailer', 'transfer-encoding', 'upgrade'))
+_SKIP_RESPONSE_HEADERS = frozenset(('content-encoding', 'transfer-encoding', 'content-length'))
+
+# 静态资源文件扩展名（不存在时直接404，存在时允许浏览器缓存）
+_STATIC_ASSET_EXTS = frozenset(('.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico',
+                                '.woff', '.woff2', '.ttf', '.eot', '.map', '.json'))
+# 静态资源的浏览器缓存时间（秒），过期后通过 ETag/Last-Modified 协商返回304
+STATIC_MAX_AGE = 3600
+
+# 'index.html' 的长度，判断首页时只对路径末尾做小写比较
+_INDEX_LEN = len('index.html')
+
+# 代理转发非HTML响应时的分块大小
+PROXY_CHUNK_SIZE = 64 * 1024
+
+# 插件静态资源目录
+PLUGIN_STATIC_PATH = '/Users/lucius/Projects/WebAppHostingBase/agent/plugins'
+
+# 路径遍历检查用的根目录绝对路径（带结尾分隔符，启动时计算一次）
+STATIC_ROOT_ABS = None
+PLUGIN_STATIC_ABS = os.path.join(os.path.abspath(PLUGIN_STATIC_PATH), '')
+
+def _stat_or_none(path):
+    """获取文件状态，文件不存在或无法访问时返回None（一次系统调用完成存在性检查）"""
+    try:
+        return os.stat(path)
+    except OSError:
         return None
+
+def _is_within(root_abs, file_path):
+    """检查文件路径是否位于根目录内（file_path 已基于绝对根目录拼接，只需规范化）"""
+    return os.path.normpath(file_path).startswith(root_abs)
+
+# 注入位置：</head> 或 <body> 开始标签，一次扫描取最先出现者（模块加载时编译一次）
+_INJECT_RE = re.compile(rb'</head>|<body[^>]*>', re.IGNORECASE)
+
+# 插件是否可用；不可用（缺失或为空）时注入直接跳过，每隔 PLUGIN_RETRY_INTERVAL 秒重新检查一次
+_PLUGIN_OK = False
+_plugin_retry_at = 0.0
+PLUGIN_RETRY_INTERVAL = 5.0
+
+# 插件脚本前的标记注释，HTML中已包含该标记时不再重复注入
+_PLUGIN_MARKER = b'<!-- __sdm_plugin_injected__ -->'
+
+# 插件脚本缓存：(插件路径, 修改时间) -> 包装好的script标签（UTF-8字节），插件文件修改后自动失效
+_plugin_cache = {}
+
+def load_plugin_script():
+    """加载JS插件并包装为script标签字节串（按文件修改时间缓存，未修改时不重复读取）"""
+    plugin_path = config['plugin_path']
+    try:
+        st = os.stat(plugin_path)
+    except (TypeError, OSError):
+        logger.error("插件文件不存在: %s", plugin_path)
+        return None
+    
+    cache_key = (plugin_path, st.st_mtime_ns)
+    plugin_script = _plugin_cache.get(cache_key)
+    if plugin_script is not None:
+        return plugin_script
     
     try:
-        with open(config['plugin_path'], 'r', encoding='utf-8') as f:
+        with open(plugin_path, 'rb') as f:
             content = f.read()
-            logger.info(f"成功加载插件文件: {config['plugin_path']}")
-            return content
     except Exception as e:
-        logger.error(f"读取插件文件失败: {e}")
+        logger.error("读取插件文件失败: %s", e)
         return None
+    
+    logger.info("成功加载插件文件: %s", plugin_path)
+    plugin_script = b''.join((
+        b'\n', _PLUGIN_MARKER, b'\n<script type="text/javascript">\n', content, b'\n</script>\n'
+    )) if content else b''
+    _plugin_cache.clear()
+    _plugin_cache[cache_key] = plugin_script
+    return plugin_script
 
 def inject_plugin_to_html(html_content):
-    """向HTML内容注入JS插件"""
-    plugin_content = load_plugin_content()
-    if not plugin_content:
+    """向HTML内容注入JS插件（全程使用字节串，不做解码/编码）"""
+    global _PLUGIN_OK, _plugin_retry_at
+    if not _PLUGIN_OK and time.monotonic() < _plugin_retry_at:
+        return html_content
+    
+    plugin_script = load_plugin_script()
+    _PLUGIN_OK = bool(plugin_script)
+    if not _PLUGIN_OK:
+        _plugin_retry_at = time.monotonic() + PLUGIN_RETRY_INTERVAL
         return html_content
     
-    # 创建插件脚本标签
-    plugin_script = f'\n<script type="text/javascript">\n{plugin_content}\n</script>\n'
-    
-    # 尝试在 </head> 标签前注入
-    if '</head>' in html_content:
-        html_content = html_content.replace('</head>', plugin_script + '</head>')
-        logger.info("插件已注入到 </head> 标签前")
-    # 如果没有 </head>，尝试在 <body> 标签后注入
-    elif '<body' in html_content:
-        # 找到 <body> 标签的结束位置
-        body_match = re.search(r'<body[^>]*>', html_content, re.IGNORECASE)
-        if body_match:
-            insert_pos = body_match.end()
-            html_content = html_content[:insert_pos] + plugin_script + html_content[insert_pos:]
-            logger.info("插件已注入到 <body> 标签后")
-    # 如果都没有，在文档开头注入
+    # 已注入过（例如上游已处理或构建产物中已内置插件）时直接返回
+    if _PLUGIN_MARKER in html_content:
+        return html_content
+    
+    match = _INJECT_RE.search(html_content)
+    if match is None:
+        # 既没有 </head> 也没有 <body>，在文档开头注入
+        insert_pos = 0
+        logger.debug("插件已注入到文档开头")
+    elif match.group(0).startswith(b'</'):
+        # 在 </head> 标签前注入
+        insert_pos = match.start()
+        logger.debug("插件已注入到 </head> 标签前")
     else:
-        html_content = plugin_script + html_content
-        logger.info("插件已注入到文档开头")
+        # 在 <body> 标签后注入
+        insert_pos = match.end()
+        logger.debug("插件已注入到 <body> 标签后")
     
-    return html_content
+    return b''.join((html_content[:insert_pos], plugin_script, html_content[insert_pos:]))
 
 @app.route('/sdm-plugins/<path:filename>')
 def handle_plugin_static(filename):
     """处理插件静态资源请求"""
-    plugin_static_path = '/Users/lucius/Projects/WebAppHostingBase/agent/plugins'
-    
-    if not os.path.exists(plugin_static_path):
-        abort(404, "插件目录不存在")
-    
-    file_path = os.path.join(plugin_static_path, filename)
+    file_path = os.path.join(PLUGIN_STATIC_ABS, filename)
     
     # 安全检查：防止路径遍历攻击
-    if not os.path.abspath(file_path).startswith(os.path.abspath(plugin_static_path)):
+    if not _is_within(PLUGIN_STATIC_ABS, file_path):
         abort(403, "访问被拒绝")
     
-    if not os.path.exists(file_path):
+    # 插件目录不存在时同样在这里返回404
+    if _stat_or_none(file_path) is None:
         abort(404, "插件文件不存在")
     
     try:
@@ -95,7 +209,7 @@ def handle_plugin_static(filename):
         filename = os.path.basename(file_path)
         return send_from_directory(directory, filename)
     except Exception as e:
-        logger.error(f"发送插件文件失败: {e}")
+        logger.error("发送插件文件失败: %s", e)
         abort(404, "文件不存在")
 
 @app.route('/', defaults={'path': ''})
@@ -115,32 +229,31 @@ def handle_request(path):
 
 def handle_static_request(path):
     """处理静态文件请求"""
-    static_path = config['static_path']
-    
-    if not static_path or not os.path.exists(static_path):
+    # 静态资源目录已在启动时检查，这里无需每次请求再stat
+    if STATIC_ROOT_ABS is None:
         abort(404, "静态资源目录不存在")
     
     # 如果路径为空或以 / 结尾，默认查找 index.html
     if not path or path.endswith('/'):
         path = os.path.join(path, 'index.html')
     
-    file_path = os.path.join(static_path, path)
+    file_path = os.path.join(STATIC_ROOT_ABS, path)
     
     # 安全检查：防止路径遍历攻击
-    if not os.path.abspath(file_path).startswith(os.path.abspath(static_path)):
+    if not _is_within(STATIC_ROOT_ABS, file_path):
         abort(403, "访问被拒绝")
     
     # 检查文件是否存在
-    if not os.path.exists(file_path):
+    if _stat_or_none(file_path) is None:
         # 判断是否为静态资源文件（有明确的文件扩展名）
         _, ext = os.path.splitext(path)
-        if ext and ext.lower() in ['.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.woff', '.woff2', '.ttf', '.eot', '.map', '.json']:
+        if ext.lower() in _STATIC_ASSET_EXTS:
             # 静态资源文件不存在时直接返回404
             abort(404, "文件不存在")
         else:
             # 对于页面路由（无扩展名或html扩展名），回退到 index.html
-            index_path = os.path.join(static_path, 'index.html')
-            if os.path.exists(index_path):
+            index_path = os.path.join(STATIC_ROOT_ABS, 'index.html')
+            if _stat_or_none(index_path) is not None:
                 file_path = index_path
             else:
                 abort(404, "文件不存在")
@@ -148,24 +261,30 @@ def handle_static_request(path):
     # 如果是 index.html 文件，进行插件注入
     if os.path.basename(file_path).lower() == 'index.html':
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
+            with open(file_path, 'rb') as f:
                 html_content = f.read()
             
             # 注入插件
             html_content = inject_plugin_to_html(html_content)
             
-            return Response(html_content, mimetype='text/html')
+            # 注入内容随插件变化，禁止浏览器缓存
+            return Response(html_content, mimetype='text/html', headers={'Cache-Control': 'no-store'})
         except Exception as e:
-            logger.error(f"读取HTML文件失败: {e}")
+            logger.error("读取HTML文件失败: %s", e)
             abort(500, "读取文件失败")
     
-    # 其他文件直接返回
+    # 其他文件直接返回（send_from_directory 默认支持条件请求，未修改时返回304）
     try:
         directory = os.path.dirname(file_path)
         filename = os.path.basename(file_path)
+        if os.path.splitext(filename)[1].lower() in _STATIC_ASSET_EXTS:
+            # 传入max_age才会去掉默认的no-cache，并同时设置Expires
+            response = send_from_directory(directory, filename, max_age=STATIC_MAX_AGE)
+            response.cache_control.public = True
+            return response
         return send_from_directory(directory, filename)
     except Exception as e:
-        logger.error(f"发送文件失败: {e}")
+        logger.error("发送文件失败: %s", e)
         abort(404, "文件不存在")
 
 def handle_proxy_request(path):
@@ -175,62 +294,54 @@ def handle_proxy_request(path):
     if not target_url:
         abort(500, "目标URL未配置")
     
-    # 构建完整的目标URL
-    if path:
-        full_url = urljoin(target_url.rstrip('/') + '/', path)
-    else:
+    # 构建完整的目标URL（常见的相对路径直接拼接，只有绝对地址才交给urljoin解析）
+    if not path:
         full_url = target_url
+    elif path.startswith(('http://', 'https://', '//')):
+        full_url = urljoin(_TARGET_BASE, path)
+    else:
+        full_url = _TARGET_BASE + path
     
     # 添加查询参数
     if request.query_string:
         full_url += '?' + request.query_string.decode('utf-8')
     
     try:
-        # 准备请求头
-        headers = dict(request.headers)
-        # 移除可能导致问题的头部
-        headers.pop('Host', None)
-        headers.pop('Content-Length', None)
+        # 准备请求头（移除可能导致问题的头部）
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in _SKIP_REQUEST_HEADERS}
         
-        # 发送请求到目标服务器
-        if request.method == 'GET':
-            resp = requests.get(full_url, headers=headers, stream=True, timeout=30)
-        elif request.method == 'POST':
-            resp = requests.post(full_url, headers=headers, data=request.get_data(), stream=True, timeout=30)
-        elif request.method == 'PUT':
-            resp = requests.put(full_url, headers=headers, data=request.get_data(), stream=True, timeout=30)
-        elif request.method == 'DELETE':
-            resp = requests.delete(full_url, headers=headers, stream=True, timeout=30)
-        else:
-            resp = requests.request(request.method, full_url, headers=headers, data=request.get_data(), stream=True, timeout=30)
+        # 是否为首页只取决于请求路径，在发送请求前即可确定
+        is_index = not path or path.endswith('/') or path[-_INDEX_LEN:].lower() == 'index.html'
         
-        # 检查是否是HTML内容且是index.html
-        content_type = resp.headers.get('Content-Type', '').lower()
-        is_html = 'text/html' in content_type
-        is_index = path == '' or path.endswith('/') or 'index.html' in path.lower()
+        # 发送请求到目标服务器（stream模式，此时只收到响应头）
+        data = None if request.method in ('GET', 'HEAD') else request.get_data()
+        resp, body_chunks = _send_upstream(request.method, full_url, headers, data)
         
-        # 准备响应头
-        response_headers = dict(resp.headers)
-        # 移除可能导致问题的头部
-        response_headers.pop('Content-Encoding', None)
-        response_headers.pop('Transfer-Encoding', None)
-        response_headers.pop('Content-Length', None)
+        # 准备响应头（移除可能导致问题的头部）
+        response_headers = {k: v for k, v in resp.headers.items() if k.lower() not in _SKIP_RESPONSE_HEADERS}
         
-        if is_html and is_index:
+        # 仅凭响应头决定处理方式：只有首页HTML才读取完整响应体进行注入
+        if is_index and 'text/html' in resp.headers.get('Content-Type', '').lower():
             # 对HTML内容进行插件注入
-            html_content = resp.text
+            try:
+                html_content = b''.join(body_chunks)
+            finally:
+                resp.close()
             html_content = inject_plugin_to_html(html_content)
             
             return Response(html_content, status=resp.status_code, headers=response_headers)
         else:
-            # 其他内容直接返回
-            return Response(resp.content, status=resp.status_code, headers=response_headers)
+            # 其他内容边读边转发，不在内存中缓存完整响应体
+            response = Response(body_chunks, status=resp.status_code,
+                                headers=response_headers, direct_passthrough=True)
+            response.call_on_close(resp.close)
+            return response
     
-    except requests.exceptions.RequestException as e:
-        logger.error(f"代理请求失败: {e}")
+    except _UPSTREAM_ERRORS as e:
+        logger.error("代理请求失败: %s", e)
         abort(502, "代理请求失败")
     except Exception as e:
-        logger.error(f"处理代理请求时发生错误: {e}")
+        logger.error("处理代理请求时发生错误: %s", e)
         abort(500, "服务器内部错误")
 
 @app.route('/health')
@@ -256,6 +367,7 @@ def get_config():
 
 def main():
     """主函数"""
+    global STATIC_ROOT_ABS, CLIENT, _TARGET_BASE
     parser = argparse.ArgumentParser(description='JS插件注入调试服务')
     parser.add_argument('--mode', choices=['static', 'proxy'], default='static',
                        help='服务模式: static(静态文件服务) 或 proxy(反向代理)')
@@ -270,6 +382,12 @@ def main():
                        help='服务端口号')
     parser.add_argument('--host', type=str, default='0.0.0.0',
                        help='服务主机地址')
+    parser.add_argument('--x-sendfile', action='store_true',
+                       help='返回 X-Sendfile 头由前端服务器（Apache/lighttpd）发送静态文件')
+    parser.add_argument('--http2', action='store_true',
+                       help="代理模式下使用httpx以HTTP/2连接目标站点（需要 pip install 'httpx[http2]'）")
+    parser.add_argument('--production', action='store_true',
+                       help='使用waitress多线程WSGI服务器运行（需要 pip install waitress），并发处理页面资源请求')
     
     args = parser.parse_args()
     
@@ -280,6 +398,7 @@ def main():
     config['plugin_path'] = args.plugin_path
     config['port'] = args.port
     config['host'] = args.host
+    app.config['USE_X_SENDFILE'] = args.x_sendfile
     
     # 验证配置
     if config['mode'] == 'static' and not config['static_path']:
@@ -291,26 +410,47 @@ def main():
         return
     
     if config['mode'] == 'static' and not os.path.exists(config['static_path']):
-        logger.error(f"静态资源目录不存在: {config['static_path']}")
+        logger.error("静态资源目录不存在: %s", config['static_path'])
         return
     
     if not os.path.exists(config['plugin_path']):
-        logger.error(f"插件文件不存在: {config['plugin_path']}")
+        logger.error("插件文件不存在: %s", config['plugin_path'])
         return
     
+    if config['mode'] == 'proxy':
+        _TARGET_BASE = config['target_url'].rstrip('/') + '/'
+    
+    if config['mode'] == 'proxy' and args.http2:
+        try:
+            CLIENT = create_http2_client()
+        except ImportError:
+            logger.error("--http2 需要安装httpx: pip install 'httpx[http2]'")
+            return
+    
+    if config['mode'] == 'static':
+        STATIC_ROOT_ABS = os.path.join(os.path.abspath(config['static_path']), '')
+    
     # 打印配置信息
     logger.info("=== JS插件注入调试服务 ===")
-    logger.info(f"服务模式: {config['mode']}")
+    logger.info("服务模式: %s", config['mode'])
     if config['mode'] == 'static':
-        logger.info(f"静态资源目录: {config['static_path']}")
+        logger.info("静态资源目录: %s", config['static_path'])
     else:
-        logger.info(f"目标站点URL: {config['target_url']}")
-    logger.info(f"插件文件: {config['plugin_path']}")
-    logger.info(f"服务地址: http://{config['host']}:{config['port']}")
+        logger.info("目标站点URL: %s", config['target_url'])
+    logger.info("插件文件: %s", config['plugin_path'])
+    logger.info("服务地址: http://%s:%s", config['host'], config['port'])
     logger.info("=========================")
     
     # 启动服务
-    app.run(host=config['host'], port=config['port'], debug=True)
+    if args.production:
+        try:
+            from waitress import serve
+        except ImportError:
+            logger.error("--production 需要安装waitress: pip install waitress")
+            return
+        serve(app, host=config['host'], port=config['port'], threads=PRODUCTION_THREADS)
+    else:
+        app.run(host=config['host'], port=config['port'], debug=True)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file